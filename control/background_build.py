@@ -0,0 +1,57 @@
+import asyncio
+from logging import info, error
+
+class BackgroundBuild:
+    ''' Something slow to make, like a lookup table, made by build_fn(*key)
+    in a worker thread so the event loop keeps running meanwhile.
+
+    get(key) returns what was built for key, or None while it is still
+    being built. Only one build runs at a time, a key asked for during
+    another key's build is started on the next get after that finishes.
+    Without a running event loop the build happens in get. '''
+
+    def __init__(self, name, build_fn):
+        self.name = name
+        self.build_fn = build_fn
+
+        self.key = None
+        self.value = None
+        self.pending = None # key being built
+        self.failed = None # key whose build raised, not tried again
+        self.builds = 0
+
+    def get(self, key):
+        if key == self.key:
+            return self.value
+        if self.pending is None and key != self.failed:
+            self.start(key)
+        return self.value if key == self.key else None
+
+    def start(self, key):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.finish(key, self.build_fn(*key))
+            return
+
+        info('Building %s in the background.' % self.name)
+        self.pending = key
+        future = loop.run_in_executor(None, self.build_fn, *key)
+        future.add_done_callback(lambda future: self.done(key, future))
+
+    def done(self, key, future):
+        self.pending = None
+        if future.cancelled():
+            return
+        err = future.exception()
+        if err is not None:
+            error('Building %s failed: %s' % (self.name, err))
+            self.failed = key
+            return
+        info('Built %s.' % self.name)
+        self.finish(key, future.result())
+
+    def finish(self, key, value):
+        self.key = key
+        self.value = value
+        self.builds += 1
@@ -0,0 +1,104 @@
+import asyncio
+from time import monotonic
+
+class Topic:
+    def __init__(self, name, value_type):
+        self.name = name
+        self.value_type = value_type
+        self.value = None
+        self.version = 0 # number of times published
+        self.subscriptions = []
+
+class Subscription:
+    ''' Calls fn with the latest value of a topic. With rate (Hz) set, at
+    most that often: a publish that comes too soon is delivered when the
+    time is up, with whatever value is latest then. A value is never
+    delivered twice. '''
+
+    def __init__(self, topic, fn, rate=None):
+        self.topic = topic
+        self.fn = fn
+        self.rate = rate
+
+        self.version = 0 # version of the topic last delivered
+        self.last_time = None
+        self.handle = None
+        self.deliveries = 0
+
+    def notify(self):
+        if self.rate is None:
+            self.deliver()
+            return
+        if self.handle is not None:
+            return # already waiting, it will get the latest value.
+
+        now = monotonic()
+        if self.last_time is None or now - self.last_time >= 1.0/self.rate:
+            self.deliver()
+        else:
+            delay = self.last_time + 1.0/self.rate - now
+            self.handle = asyncio.get_running_loop().call_later(delay, self.deliver)
+
+    def deliver(self):
+        self.handle = None
+        if self.version == self.topic.version:
+            return
+        self.version = self.topic.version
+        self.last_time = monotonic()
+        self.deliveries += 1
+        self.fn(self.topic.value)
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+class Bus:
+    ''' In-process publish/subscribe between the controller's components.
+    topics maps each topic name to the type of its values. '''
+
+    def __init__(self, topics):
+        self.topics = {}
+        for name, value_type in topics.items():
+            self.topics[name] = Topic(name, value_type)
+        self.status_record = {name:{} for name in self.topics}
+
+    def topic(self, name):
+        try:
+            return self.topics[name]
+        except KeyError:
+            raise KeyError('Unknown topic: ' + name)
+
+    def publish(self, name, value):
+        topic = self.topic(name)
+        if not isinstance(value, topic.value_type):
+            raise TypeError('%s topic takes %s, not %s' % (
+                name, topic.value_type.__name__, type(value).__name__))
+        topic.value = value
+        topic.version += 1
+        for subscription in topic.subscriptions:
+            subscription.notify()
+
+    def subscribe(self, name, fn, rate=None):
+        topic = self.topic(name)
+        subscription = Subscription(topic, fn, rate)
+        topic.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.cancel()
+        subscription.topic.subscriptions.remove(subscription)
+
+    def latest(self, name):
+        return self.topic(name).value
+
+    def status(self):
+        d = self.status_record
+        for name, topic in self.topics.items():
+            delivered = 0
+            for subscription in topic.subscriptions:
+                delivered += subscription.deliveries
+            t = d[name]
+            t['published'] = topic.version
+            t['delivered'] = delivered
+        return d
@@ -0,0 +1,59 @@
+
+class CandidateScheduler:
+    ''' Chooses the order the collision controller tries its candidate
+    deviations in. The requested steer (deviation 0) is always tried first
+    so the vehicle goes back to it as soon as it can, then the last choice
+    and its neighbours, then the rest by how often they have been clear
+    recently. Keeps count of how many candidates are checked per scan. '''
+
+    def __init__(self, decay=0.9):
+        self.decay = decay
+        self.scores = {}
+        self.last_choice = None
+
+        self.scans = 0
+        self.checked = 0
+        self.average_checked = 0
+        self.status_record = {}
+
+    def order(self, candidates):
+        ''' Reorder a list of (deviation, steer) pairs. '''
+        deviations = [dev for dev, steer in candidates]
+        first = [0]
+        if self.last_choice is not None:
+            last = self.last_choice
+            first += sorted(deviations, key=lambda dev: abs(dev - last))[:3]
+
+        rank = {}
+        for dev in first:
+            if dev in deviations and dev not in rank:
+                rank[dev] = len(rank)
+
+        # stable sort, so equal scores keep the original order.
+        rest = sorted((dev for dev in deviations if dev not in rank),
+                      key=lambda dev: -self.scores.get(dev, 0))
+        for dev in rest:
+            rank[dev] = len(rank)
+
+        return sorted(candidates, key=lambda c: rank[c[0]])
+
+    def record(self, deviations, blocked, choice):
+        ''' Record the result of a scan: the deviations checked, whether each
+        was blocked and the one chosen, or None. '''
+        for dev in self.scores:
+            self.scores[dev] *= self.decay
+        for dev, dev_blocked in zip(deviations, blocked):
+            if not dev_blocked:
+                self.scores[dev] = self.scores.get(dev, 0) + 1
+        self.last_choice = choice
+
+        self.scans += 1
+        self.checked += len(deviations)
+        self.average_checked += (len(deviations) - self.average_checked)*(1 - self.decay)
+
+    def status(self):
+        d = self.status_record
+        d['last_choice'] = self.last_choice
+        d['checked_per_scan'] = self.checked/self.scans if self.scans else 0
+        d['recent_checked_per_scan'] = self.average_checked
+        return d
@@ -0,0 +1,80 @@
+
+from math import sqrt
+import numpy as np
+
+def distance_transform(occupied):
+    ''' Euclidean distance, in cells, from every cell to the nearest
+    occupied cell. Exact, done as two passes: along each column, then
+    combining the columns along each row. Cells with no occupied cell
+    anywhere get inf. '''
+    if occupied.shape[1] > occupied.shape[0]:
+        # the second pass is quadratic in the row length.
+        return distance_transform(occupied.T).T
+
+    rows, cols = occupied.shape
+    index = np.arange(rows)[:,None]
+    big = 2*(rows + cols)
+
+    # distance to the nearest occupied cell in the same column.
+    last = np.maximum.accumulate(np.where(occupied, index, -big), axis=0)
+    after = np.where(occupied, index, 2*big)[::-1]
+    next = np.minimum.accumulate(after, axis=0)[::-1]
+    g = np.minimum(index - last, next - index).astype(np.float32)
+
+    # d(r, c)^2 = min over c' of (c - c')^2 + g(r, c')^2
+    c = np.arange(cols)
+    dc2 = ((c[:,None] - c[None,:])**2).astype(np.float32)
+    d2 = (dc2[None,:,:] + (g*g)[:,None,:]).min(axis=2)
+
+    d = np.sqrt(d2)
+    d[d >= big] = np.inf
+    return d
+
+class ClearanceMap:
+    ''' Distance to the nearest obstacle for the area in front of the
+    vehicle, x to the right and y ahead, rebuilt from the obstacle points of
+    every scan. Looking up the clearance of a path is then just indexing.
+
+    Points and path samples are both snapped to cell centres, so the values
+    returned are lowered by a cell diagonal to never exceed the real
+    clearance. '''
+
+    def __init__(self, min_x=-6.0, max_x=6.0, min_y=-2.0, max_y=6.0,
+                 resolution=0.1, max_clearance=5.0):
+        self.min_x = min_x
+        self.min_y = min_y
+        self.resolution = resolution
+        self.max_clearance = max_clearance
+        self.error = resolution*sqrt(2)
+
+        self.cols = int(round((max_x - min_x)/resolution))
+        self.rows = int(round((max_y - min_y)/resolution))
+        self.occupied = np.zeros((self.rows, self.cols), dtype=bool)
+        self.field = np.full((self.rows, self.cols), max_clearance)
+
+    def cell_index(self, xs, ys):
+        col = np.floor((xs - self.min_x)/self.resolution).astype(int)
+        row = np.floor((ys - self.min_y)/self.resolution).astype(int)
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        return row, col, inside
+
+    def update(self, points):
+        ''' Rebuild the map from an (n, 2) array of obstacle points. '''
+        self.occupied.fill(False)
+        if len(points) > 0:
+            row, col, inside = self.cell_index(points[:,0], points[:,1])
+            self.occupied[row[inside], col[inside]] = True
+
+        if self.occupied.any():
+            d = distance_transform(self.occupied)*self.resolution - self.error
+            np.minimum(d, self.max_clearance, out=self.field)
+        else:
+            self.field.fill(self.max_clearance)
+
+    def clearance(self, xs, ys):
+        ''' Clearance at each of the positions. Positions outside the map
+        get max_clearance. '''
+        row, col, inside = self.cell_index(xs, ys)
+        values = np.full(np.shape(xs), self.max_clearance)
+        values[inside] = self.field[row[inside], col[inside]]
+        return values
@@ -1,48 +1,121 @@
-
-import asynchat
-import socket
+import asyncio
 from logging import error, info, warning
 
-class Client(asynchat.async_chat):
-    def __init__(self, socket=None, connect_fn=None, msg_fn=None, close_fn=None):
-        asynchat.async_chat.__init__(self, socket)
-        
-        self.received_data = bytearray()
-        self.set_terminator(b'\n')
+# longest line a client will read, longer ones close the connection.
+line_limit = 2**20
+
+class Client(asyncio.BufferedProtocol):
+    ''' A newline terminated message connection on the running asyncio loop.
+    Data is received straight into a reusable buffer and every complete line
+    in it is split off at once. Lines go to lines_fn(client, lines) as a list
+    of bytes if it's set, otherwise one at a time to msg_fn(client, line) as
+    strings. '''
+
+    def __init__(self, connect_fn=None, msg_fn=None, close_fn=None, lines_fn=None, buffer_size=2**16):
+        self.transport = None
         self.host = None
         self.port = None
+        self.task = None
+        self.closed = False
+
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.length = 0 # bytes of buffer in use
 
         self.connect_fn = connect_fn
         self.msg_fn = msg_fn
         self.close_fn = close_fn
+        self.lines_fn = lines_fn
 
     def create_connection(self, host, port):
         self.host = host
         self.port = port
-        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.task = asyncio.get_running_loop().create_task(self.connect())
+
+    async def connect(self):
         try:
-            self.connect((self.host, self.port))
-        except ConnectionRefusedError:
+            await asyncio.get_running_loop().create_connection(
+                lambda: self, self.host, self.port)
+        except OSError:
             error("Client failed to connect.")
+            self.handle_close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.handle_connect()
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            warning("Client connection error: " + str(exc))
+        self.handle_close()
+
+    def get_buffer(self, sizehint):
+        if self.length == len(self.buffer):
+            self.grow_buffer()
+        return self.view[self.length:]
+
+    def grow_buffer(self):
+        buffer = bytearray(2*len(self.buffer))
+        buffer[:self.length] = self.view[:self.length]
+        self.view.release()
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+
+    def buffer_updated(self, nbytes):
+        start = self.length
+        self.length += nbytes
+
+        # only the new data can hold new terminators.
+        buffer = self.buffer
+        end = buffer.find(b'\n', start, self.length)
+        if end < 0:
+            if self.length >= line_limit:
+                warning("Client line is too long, closing connection.")
+                self.close()
+            return
+
+        lines = []
+        begin = 0
+        while end >= 0:
+            lines.append(bytes(self.view[begin:end]))
+            begin = end + 1
+            end = buffer.find(b'\n', begin, self.length)
+
+        # keep the start of the next line at the front of the buffer.
+        rest = self.length - begin
+        if rest:
+            self.view[:rest] = self.view[begin:self.length]
+        self.length = rest
+
+        try:
+            self.found_terminators(lines)
+        except Exception:
+            error("Client message handler failed.", exc_info=True)
+            self.close()
 
     def handle_connect(self):
         if self.connect_fn is not None:
             self.connect_fn(self)
         else:
             info("Unhandled connect.")
-    
-    def collect_incoming_data(self, data):
-        self.received_data.extend(data)
-
-    def found_terminator(self):
-        msg = self.received_data.decode()
-        if self.msg_fn is not None:        
-            self.msg_fn(self, msg)
+
+    def found_terminators(self, lines):
+        if self.lines_fn is not None:
+            self.lines_fn(self, lines)
+        elif self.msg_fn is not None:
+            for line in lines:
+                self.msg_fn(self, line.decode())
         else:
             info("Unhandled message.")
-        self.received_data.clear()
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
 
     def handle_close(self):
+        if self.closed:
+            return
+        self.closed = True
         self.close()
         if self.close_fn is not None:
             self.close_fn(self)
@@ -52,6 +125,11 @@ class Client(asynchat.async_chat):
     def send_msg(self, msg):
         if not msg.endswith('\n'):
             msg += '\n'
-        data = msg.encode()
-        self.push(data)
+        self.send_data(msg.encode())
 
+    def send_data(self, data):
+        ''' Send already encoded, newline terminated messages. '''
+        if self.transport is None or self.transport.is_closing():
+            warning("Client is not connected, dropping message.")
+            return
+        self.transport.write(data)
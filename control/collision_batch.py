@@ -0,0 +1,171 @@
+
+from math import ceil, pi
+import numpy as np
+
+from vehicle_geometry import vehicle_length, axle_offset, min_turn_steer
+
+# Array versions of make_path, scan_to_points and path_near_points from
+# collision_control. Every candidate path is checked against every scan
+# point in one broadcast operation instead of a python double loop.
+
+def path_sample_count(step, path_length):
+    ''' Number of points make_path adds after the starting point. '''
+    if path_length <= 0:
+        return 0
+    return int(ceil(path_length/step))
+
+def make_paths(steers, step, path_length):
+    ''' Return x and y arrays with one row per steering angle. Row k is the
+    same path make_path(steers[k], step, path_length) gives. '''
+    steers = np.asarray(steers, dtype=float)
+    k = np.arange(path_sample_count(step, path_length) + 1, dtype=float)
+
+    xs = np.zeros((len(steers), len(k)))
+    ys = np.zeros((len(steers), len(k)))
+
+    turning = np.abs(steers) > min_turn_steer
+    steer = steers[turning]
+    R = vehicle_length/np.tan(np.abs(steer))
+    Rm = np.sqrt(axle_offset**2 + R**2)[:,None]
+    t = (step/Rm)*k
+
+    xs[turning] = np.sign(steer)[:,None]*Rm*(1 - np.cos(t))
+    ys[turning] = Rm*np.sin(t)
+    ys[~turning] = step*k
+    return xs, ys
+
+def scan_to_array(ranges, start_angle, angle_inc_degrees, non_range_val=-1, threshold=5):
+    ''' Same points as scan_to_points as an (n, 2) array. '''
+    r = np.asarray(ranges, dtype=float)
+    angles = np.radians(start_angle + angle_inc_degrees*np.arange(len(r)))
+
+    hit = (r != non_range_val) & (r < threshold)
+    r = r[hit]
+    angles = angles[hit]
+    if len(r) == 0:
+        return np.zeros((0, 2))
+
+    # each hit is padded with points every meter out to 5 meters.
+    pads = np.arange(int(ceil(5 - r.min())))
+    rr = r[:,None] + pads
+    keep = rr < 5
+    rr = rr[keep]
+    angles = np.broadcast_to(angles[:,None], keep.shape)[keep]
+    return np.column_stack((rr*np.sin(angles), rr*np.cos(angles)))
+
+def paths_near_points(xs, ys, points, threshold):
+    ''' For each path (row of xs, ys) return the index of the first point that
+    is less than threshold distance to one of the points, or -1. '''
+    first = np.full(xs.shape[0], -1)
+    if len(points) == 0 or xs.shape[1] == 0:
+        return first
+
+    dx = xs[:,:,None] - points[:,0]
+    dy = ys[:,:,None] - points[:,1]
+    near = (dx*dx + dy*dy < threshold**2).any(axis=2)
+
+    hit = near.any(axis=1)
+    first[hit] = near[hit].argmax(axis=1)
+    return first
+
+def path_point_lists(xs, ys, count=None):
+    ''' Paths as lists of [x, y] points, suitable for status messages. '''
+    return np.stack((xs[:count], ys[:count]), axis=2).tolist()
+
+def arc_distances(steers, path_length, points):
+    ''' Exact distance from every point to every candidate path, without
+    sampling the paths. The paths are the arcs (or straight lines) make_path
+    samples, of length path_length. Returns two (steers, points) arrays: the
+    distance to the path and how far along the path the nearest position is. '''
+    steers = np.asarray(steers, dtype=float)
+    px = points[:,0][None,:]
+    py = points[:,1][None,:]
+
+    distance = np.empty((len(steers), len(points)))
+    along = np.empty((len(steers), len(points)))
+
+    straight = np.abs(steers) <= min_turn_steer
+    s = np.clip(py, 0, path_length)
+    distance[straight] = np.hypot(px, py - s)
+    along[straight] = s
+
+    turning = ~straight
+    if turning.any():
+        steer = steers[turning]
+        sign = np.sign(steer)[:,None]
+        R = vehicle_length/np.tan(np.abs(steer))
+        Rm = np.sqrt(axle_offset**2 + R**2)[:,None]
+        end = path_length/Rm # angle swept by the path
+
+        # angle of each point around the turning centre, measured from
+        # the start of the path in the direction of travel.
+        cx = px - sign*Rm
+        rho = np.hypot(cx, py)
+        phi = np.arctan2(py, -sign*cx) % (2*pi)
+        on_arc = phi <= end
+
+        # off the arc, the nearest position is one of the ends.
+        to_start = np.hypot(px, py)
+        ex = sign*Rm*(1 - np.cos(end))
+        ey = Rm*np.sin(end)
+        to_end = np.hypot(px - ex, py - ey)
+        nearer_start = to_start <= to_end
+
+        distance[turning] = np.where(on_arc, np.abs(rho - Rm),
+                                     np.minimum(to_start, to_end))
+        along[turning] = np.where(on_arc, phi*Rm,
+                                  np.where(nearer_start, 0, path_length))
+    return distance, along
+
+def rays_near_paths(xs, ys, angles, max_range, threshold):
+    ''' For each path (row of xs, ys) and ray, whether any point of the
+    path after the first is less than threshold distance to the ray, from
+    the scanner out to max_range. An obstacle anywhere on a ray that isn't
+    near a path can't block it. angles are in radians, clockwise from ahead.
+    Returns a (paths, rays) bool array. '''
+    ux = np.sin(angles)
+    uy = np.cos(angles)
+    px = xs[:,1:,None]
+    py = ys[:,1:,None]
+    t = np.clip(px*ux + py*uy, 0, max_range)
+    dx = px - t*ux
+    dy = py - t*uy
+    return (dx*dx + dy*dy < threshold**2).any(axis=1)
+
+def coarse_paths_near_points(xs, ys, points, threshold, stride, step):
+    ''' Cheap first pass of paths_near_points that only looks at the first,
+    last and every stride-th point of each path. step is the most the
+    points of a path are apart. Returns first and ambiguous: first is 0 if
+    the first point is near, the index of a near checked point if there is
+    one (paths_near_points may find an earlier one), otherwise -1 if no
+    point of the path can be near. ambiguous marks the paths it couldn't
+    decide, whose first means nothing. '''
+    first = np.full(xs.shape[0], -1)
+    ambiguous = np.zeros(xs.shape[0], dtype=bool)
+    if len(points) == 0 or xs.shape[1] == 0:
+        return first, ambiguous
+
+    last = xs.shape[1] - 1
+    coarse = np.unique(np.append(np.arange(0, last + 1, stride), last))
+    dx = xs[:,coarse,None] - points[:,0]
+    dy = ys[:,coarse,None] - points[:,1]
+    d2 = (dx*dx + dy*dy).min(axis=2)
+
+    # every point is at most stride//2 steps from a checked one.
+    margin = (stride//2)*step
+    near = d2 < threshold**2
+    far = d2 >= (threshold + margin)**2
+
+    hit = near.any(axis=1)
+    first[hit] = coarse[near[hit].argmax(axis=1)]
+    ambiguous = ~hit & ~far.all(axis=1)
+    return first, ambiguous
+
+def points_in_reach(xs, ys, points, threshold):
+    ''' The points that are less than threshold distance to the circle
+    around the origin holding every path point. The others can't be near
+    any of the paths. '''
+    if len(points) == 0 or xs.size == 0:
+        return points
+    reach = np.sqrt((xs*xs + ys*ys).max()) + threshold
+    return points[(points*points).sum(axis=1) < reach**2]
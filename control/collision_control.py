@@ -1,23 +1,29 @@
 
 from random import random
-from math import pi, cos, sin, tan, radians, ceil, sqrt
+from math import pi, cos, sin, tan, radians, ceil, floor, sqrt
 from utils import wrap_radians, clamp
 from logging import error, warning, info, debug
 
-from collections import namedtuple
-Point = namedtuple('Point',['x','y'])
+from vehicle_geometry import Point, track_offset, min_turn_steer, turn_radius, scanner_offset
+import numpy as np
+import collision_batch
+import collision_jit
+from path_library import PathLibrary
+from ray_table import RayBlockTable
+from occupancy_grid import OccupancyGrid
+from clearance_map import ClearanceMap
+from candidate_scheduler import CandidateScheduler
+from scan_preprocessor import ScanPreprocessor
+from footprint_masks import FootprintMasks
+from background_build import BackgroundBuild
 
 def make_path(steer_radians, step, path_length):
     ds = step
     a = 0
     points = [Point(0,0)]
-    if abs(steer_radians) > 0.1:
+    if abs(steer_radians) > min_turn_steer:
         sign = 1 if steer_radians > 0 else -1
-        L = (1.6 + 2.3)/3.0 # vehicle length
-        Lm = 2.3/3.0 # distance from vehicle's 'center' to the back axle
-        R = L/tan(abs(steer_radians))
-        Rm = sqrt(Lm**2 + R**2) # radius to vehicle mid-point
-        Rm*=1.0 # hack to mess with the turning circle.
+        Rm = turn_radius(steer_radians) # radius to vehicle mid-point
         dt = ds/Rm # angle increment
         a = 0
         t = dt
@@ -64,10 +70,47 @@ def scan_to_points(ranges, start_angle, angle_inc_degrees, non_range_val=-1, thr
         angle_degrees += angle_inc_degrees
     return points
 
+class PointGrid:
+    ''' Points bucketed into square cells so the points near a position can
+    be found without looking at all of them. '''
+
+    def __init__(self, points, cell_size):
+        self.points = points
+        self.cell_size = cell_size
+        self.cells = {}
+        for p in points:
+            key = (floor(p.x/cell_size), floor(p.y/cell_size))
+            self.cells.setdefault(key, []).append(p)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def near(self, a, threshold):
+        ''' Return True if any point is less than threshold distance to a. '''
+        D = threshold**2
+        n = int(ceil(threshold/self.cell_size))
+        cx = floor(a.x/self.cell_size)
+        cy = floor(a.y/self.cell_size)
+        for i in range(cx - n, cx + n + 1):
+            for j in range(cy - n, cy + n + 1):
+                for b in self.cells.get((i, j), ()):
+                    if (a.x - b.x)**2 + (a.y - b.y)**2 < D:
+                        return True
+        return False
+
 def path_near_points(path, points, threshold):
     ''' Return the index of the first point in the path that is
     less than threshold distance to one of the points. Otherwise
-    return None.'''
+    return None. points may be a list of points or a PointGrid.'''
+
+    if isinstance(points, PointGrid):
+        for num, a in enumerate(path):
+            if points.near(a, threshold):
+                return num
+        return None
 
     D = threshold**2
     num = 0
@@ -80,6 +123,16 @@ def path_near_points(path, points, threshold):
         num += 1
     return None
 
+def build_ray_table(num_rays, start_angle, angle_inc_degrees, max_steer, step,
+                    clearance, steer_quantum):
+    return RayBlockTable(num_rays, start_angle, angle_inc_degrees, max_steer,
+                         step, max_length=5, clearance=clearance,
+                         steer_quantum=steer_quantum)
+
+def build_footprints(max_steer, step, clearance, steer_quantum):
+    return FootprintMasks(max_steer, step, max_length=5, clearance=clearance,
+                          steer_quantum=steer_quantum)
+
 class CollisionController:
     def __init__(self, state, speed_control, basic_controls):
         self.vstate = state
@@ -94,6 +147,18 @@ class CollisionController:
         self.right_most_ray_degrees = 90
         self.non_range_val = 5 # indicates the scanner didn't pick up anything.
 
+        # with preprocess_scan set, scans go through scan_preprocessor before
+        # anything else, min-pooled to output_degrees_per_ray (None keeps
+        # the scanner's) and with returns that have no neighbour within
+        # outlier_distance dropped (None keeps them). The layout of the rays
+        # used is in scan_start_angle and scan_angle_inc.
+        self.preprocess_scan = False
+        self.output_degrees_per_ray = None
+        self.outlier_distance = None
+        self.scan_preprocessor = ScanPreprocessor()
+        self.scan_start_angle = self.right_most_ray_degrees
+        self.scan_angle_inc = -self.degrees_per_ray
+
         self.requested_steer = 0
         self.requested_speed = 0
         self.actual_steer = 0
@@ -104,55 +169,224 @@ class CollisionController:
         self.blocked_paths = []
         self.max_steer = pi/4
         self.max_req_steer = pi/12
+        self.deviations = [0,-1,1,-2,2,-3,3,-4,4,-6,6,-8,8]
+
+        self.path_step = 0.25
+        self.clearance = 0.5 # how close a wheel track may get to an obstacle.
+
+        # 'numpy' checks all the candidate paths at once, 'python' checks
+        # them one at a time, 'table' looks the rays up in a RayBlockTable,
+        # 'clearance' looks the paths up in a ClearanceMap, 'analytic'
+        # measures the distance from each obstacle to each unsampled path,
+        # 'footprint' checks the swept body in FootprintMasks, 'window'
+        # does a dynamic window search over speed and steer and 'jit' is
+        # 'python' with the compiled collision_jit kernels, if numba is
+        # installed.
+        self.backend = 'numpy'
+        self.active_backend = self.backend
+        self.actual_speed = 0
+
+        # with warm_start set, the first-clear backends (python, numpy, table
+        # and footprint) try the requested steer, then last scan's choice and
+        # its neighbours first.
+        self.warm_start = False
+        self.scheduler = CandidateScheduler(decay=0.9)
+
+        # with incremental set, the numpy backend only re-checks candidates
+        # near rays that changed by more than range_tolerance.
+        self.incremental = False
+        self.range_tolerance = 0.05
+        self.incremental_key = None
+        self.full_evaluations = 0
+        self.partial_evaluations = 0
+        self.skipped_evaluations = 0
+
+        # with coarse_to_fine set, the numpy backend first checks the wheel
+        # tracks every coarse_step with the clearance grown by the gap, and
+        # only checks every path_step where that can't decide. The choice is
+        # the same, but hit_distances of blocked candidates can be further
+        # out unless ttc_scaling needs them.
+        self.coarse_to_fine = False
+        self.coarse_step = 1.0
+        self.fine_checks = 0
+        self.fine_checks_avoided = 0
+
+        # with ttc_scaling set, the speed is scaled down so the first
+        # obstacle near the chosen path, looking the whole 5 m ahead, is at
+        # least ttc_target seconds away, but not below min_ttc_speed. When
+        # every path is blocked the vehicle slows down along the one with the
+        # furthest obstacle, as long as that speed is above min_ttc_speed.
+        self.ttc_scaling = False
+        self.ttc_target = 2.0
+        self.min_ttc_speed = 0.3
+        self.hit_distances = []
+        self.last_ttc = None
+
+        # dynamic window parameters.
+        self.window_dt = 0.1
+        self.window_steers = 19
+        self.window_speeds = 5
+        self.max_accel = 1.0
+        self.max_decel = 2.0
+        self.window_weights = [1.0, 1.0, 0.5] # heading, free distance, speed
+
+        self.clearance_map = ClearanceMap(resolution=0.1)
+        self.path_clearances = []
+        self.rank_by_clearance = False
+        self.good_clearance = 1.0
+
+        # 'scan' checks the paths against the latest scan only, 'grid' against
+        # an occupancy grid that remembers obstacles that have left the scan.
+        # The table backend always uses the scan.
+        self.obstacle_source = 'scan'
+        self.occupancy_grid = OccupancyGrid(size=12.0, resolution=0.1)
+
+        # the table and footprint backends' lookup tables are built in the
+        # background when their parameters change, and the numpy backend is
+        # used until they're ready. Likewise the jit kernels are compiled in
+        # the background, using the python backend meanwhile.
+        self.path_library = PathLibrary(max_length=5)
+        self.ray_tables = BackgroundBuild('collision ray table', build_ray_table)
+        self.footprint_masks = BackgroundBuild('footprint masks', build_footprints)
+        self.jit_kernels = BackgroundBuild('collision jit kernels', collision_jit.warm_up)
+        self.ray_table = None
+        self.footprints = None
+
+        # filled in by status, so a status snapshot doesn't allocate.
+        self.status_record = {}
+        self.evaluations_record = {}
+        self.fine_checks_record = {}
 
     def update_range(self, ranges):
 
         if not self.enabled:
             return
 
-        scan_points = scan_to_points(
-            ranges, self.right_most_ray_degrees, -self.degrees_per_ray)
-        self.last_obstacles = scan_points
+        if self.preprocess_scan:
+            self.scan_preprocessor.output_degrees_per_ray = self.output_degrees_per_ray
+            self.scan_preprocessor.outlier_distance = self.outlier_distance
+            ranges = self.scan_preprocessor.process(
+                ranges, self.right_most_ray_degrees, -self.degrees_per_ray)
+            self.scan_start_angle = self.scan_preprocessor.start_angle
+            self.scan_angle_inc = self.scan_preprocessor.angle_inc_degrees
+        else:
+            self.scan_start_angle = self.right_most_ray_degrees
+            self.scan_angle_inc = -self.degrees_per_ray
+
+        if self.obstacle_source == 'grid':
+            x, y = self.scanner_position()
+            self.occupancy_grid.update_scan(
+                x, y, self.vstate.heading, ranges,
+                self.scan_start_angle, self.scan_angle_inc)
+
+        if self.backend == 'jit' and not collision_jit.available:
+            warning('numba is not installed, using the python collision backend.')
+            self.backend = 'python'
+
+        backend = self.active_backend = self.choose_backend(len(ranges))
+
+        if backend == 'python':
+            scan_points = PointGrid(self.obstacle_points(ranges), self.clearance)
+            has_obstacles = len(scan_points) > 0
+            self.last_obstacles = scan_points.points
+        elif backend == 'table':
+            scan_points = []
+            has_obstacles = any(r != -1 and r < 5 for r in ranges)
+            self.last_obstacles = []
+        elif backend == 'jit' and not (self.obstacle_source == 'grid' or self.preprocess_scan):
+            # floats throughout, so it's the signature warm_up compiled.
+            scan_points = collision_jit.scan_to_points(
+                np.asarray(ranges, dtype=float), float(self.scan_start_angle),
+                float(self.scan_angle_inc), -1.0, 5.0)
+            has_obstacles = len(scan_points) > 0
+            self.last_obstacles = scan_points.tolist()
+        else: # numpy, jit, clearance, analytic, footprint and window
+            scan_points = self.obstacle_array(ranges)
+            has_obstacles = len(scan_points) > 0
+            self.last_obstacles = scan_points.tolist()
+
+        incremental = self.incremental and backend == 'numpy' \
+                      and self.obstacle_source == 'scan'
+        if not (incremental and has_obstacles):
+            self.incremental_key = None
 
         # if there are no obstacles.
-        if len(scan_points) == 0:
+        if not has_obstacles:
             if self.requested_speed > 0:
                 self.blocked = False
                 self.actual_steer = clamp(-pi/9, pi/9, self.requested_steer)
+                self.actual_speed = self.requested_speed
                 self.basic_controls.set_steer(self.actual_steer)
                 self.speed_control.set_speed(self.requested_speed)
                 self.last_path = []
         else: # there are obstacles.
+            path_length = min(self.requested_distance, 5)
+            self.actual_speed = self.requested_speed
+            self.hit_distances = []
+            self.fine_checks = 0
+            self.fine_checks_avoided = 0
+
+            deviations = None
+            if backend == 'window':
+                steers = self.window_candidate_steers()
+            else:
+                candidates = self.candidate_deviations()
+                if self.warm_start and backend in ('python', 'jit', 'numpy', 'table', 'footprint'):
+                    candidates = self.scheduler.order(candidates)
+                deviations = [dev for dev, steer in candidates]
+                steers = [steer for dev, steer in candidates]
+
+            if backend == 'window':
+                clear, paths, blocked = self.find_clear_path_window(steers, path_length, scan_points)
+            elif backend == 'python':
+                clear, paths, blocked = self.find_clear_path(steers, path_length, scan_points)
+            elif backend == 'jit':
+                clear, paths, blocked = self.find_clear_path_jit(steers, path_length, scan_points)
+            elif backend == 'table':
+                clear, paths, blocked = self.find_clear_path_table(steers, path_length, ranges)
+            elif backend == 'clearance':
+                clear, paths, blocked = self.find_clear_path_clearance(steers, path_length, scan_points)
+            elif backend == 'footprint':
+                clear, paths, blocked = self.find_clear_path_footprint(steers, path_length, scan_points)
+            elif backend == 'analytic':
+                clear, paths, blocked = self.find_clear_path_analytic(steers, path_length, scan_points)
+            elif incremental:
+                clear, paths, blocked = self.find_clear_path_incremental(
+                    steers, path_length, scan_points, ranges)
+            else:
+                clear, paths, blocked = self.find_clear_path_batch(steers, path_length, scan_points)
+
             self.blocked_paths = []
-            for dev in [0,-1,1,-2,2,-3,3,-4,4,-6,6,-8,8]:
-                # when there's obstacles around, don't allow the
-                # heading control to turn sharply.
-                req_steer = clamp(-pi/12, pi/12, self.requested_steer)
-                steer = req_steer + dev*pi/9.0
-
-                if abs(steer) > self.max_steer:
-                    continue
-
-                path_length = min(self.requested_distance, 5)
-
-                path_points = make_path(steer, 0.25, path_length)
-
-                left_path = [Point(x-1.0, y) for x,y in path_points]
-                right_path = [Point(x+1.0, y) for x,y in path_points]
-
-                left_index = path_near_points(left_path, scan_points, 0.5)
-                right_index = path_near_points(right_path, scan_points, 0.5)
-
-                if left_index or right_index:
-                    self.blocked_paths += path_points
-                else: # path is clear
-                    self.actual_steer = steer
-                    if self.requested_speed > 0:
-                        self.basic_controls.set_steer(self.actual_steer)
-                        self.speed_control.set_speed(self.requested_speed)
-                    self.blocked = False
-                    self.last_path = path_points
-                    break
+            for path, path_blocked in zip(paths, blocked):
+                if path_blocked:
+                    self.blocked_paths += path
+
+            if clear is None and self.ttc_scaling:
+                clear = self.choose_by_ttc()
+
+            if deviations is not None:
+                # the python, jit and table backends stop at the first clear path.
+                checked = len(paths) if backend in ('python', 'jit', 'table') else len(steers)
+                self.scheduler.record(deviations[:checked], blocked[:checked],
+                                      None if clear is None else deviations[clear])
+
+            self.last_ttc = None
+            if clear is not None:
+                hit = self.hit_distances[clear] if clear < len(self.hit_distances) else None
+                if hit is None and self.ttc_scaling and backend != 'window':
+                    hit = self.hit_distance_ahead(steers[clear], scan_points, ranges)
+                    if hit is not None:
+                        self.actual_speed = min(self.actual_speed, max(
+                            hit/self.ttc_target, self.min_ttc_speed))
+                if hit is not None and self.vstate.speed > 0:
+                    self.last_ttc = hit/self.vstate.speed
+
+                self.actual_steer = steers[clear]
+                if self.requested_speed > 0:
+                    self.basic_controls.set_steer(self.actual_steer)
+                    self.speed_control.set_speed(self.actual_speed)
+                self.blocked = False
+                self.last_path = paths[clear]
             else:
                 # no path found
                 self.blocked = True
@@ -160,6 +394,393 @@ class CollisionController:
                 if self.requested_speed > 0:
                     self.speed_control.stop()
 
+    def choose_backend(self, num_rays):
+        ''' The backend to use for a scan of num_rays, numpy while the
+        table or footprint backend's lookup tables are being built and
+        python while the jit kernels are being compiled. '''
+        if self.backend == 'table':
+            self.ray_table = self.ray_tables.get(
+                (num_rays, self.scan_start_angle, self.scan_angle_inc,
+                 self.max_steer, self.path_step, self.clearance,
+                 self.path_library.steer_quantum))
+            if self.ray_table is None:
+                return 'numpy'
+        elif self.backend == 'footprint':
+            self.footprints = self.footprint_masks.get(
+                (self.max_steer, self.path_step, self.clearance,
+                 self.path_library.steer_quantum))
+            if self.footprints is None:
+                return 'numpy'
+        elif self.backend == 'jit' and collision_jit.available:
+            if self.jit_kernels.get(()) is None:
+                return 'python'
+        return self.backend
+
+    def prepare_tables(self):
+        ''' Start building the lookup tables, or compiling the kernels, the
+        configured backend needs at startup rather than on the first scan. '''
+        num_rays = int(round((self.right_most_ray_degrees - self.left_most_ray_degrees)
+                             /self.degrees_per_ray)) + 1
+        self.choose_backend(num_rays)
+
+    def obstacle_points(self, ranges):
+        if self.obstacle_source == 'grid' or self.preprocess_scan:
+            return [Point(x, y) for x, y in self.obstacle_array(ranges).tolist()]
+        return scan_to_points(ranges, self.scan_start_angle, self.scan_angle_inc)
+
+    def obstacle_array(self, ranges):
+        if self.obstacle_source == 'grid':
+            x, y = self.scanner_position()
+            return self.occupancy_grid.obstacle_points(x, y, self.vstate.heading)
+        if self.preprocess_scan:
+            return self.scan_preprocessor.points(ranges)
+        return collision_batch.scan_to_array(
+            ranges, self.scan_start_angle, self.scan_angle_inc)
+
+    def scanner_position(self):
+        ''' World position of the scanner, scanner_offset ahead of the
+        vehicle's position. '''
+        heading = self.vstate.heading
+        return (self.vstate.x + scanner_offset*sin(heading),
+                self.vstate.y + scanner_offset*cos(heading))
+
+    def candidate_deviations(self):
+        ''' Return (deviation, steer) pairs in the order to try them. The
+        steers are quantized like the path library's paths, so the steer
+        commanded is the one whose path was checked. '''
+        # when there's obstacles around, don't allow the
+        # heading control to turn sharply.
+        req_steer = clamp(-pi/12, pi/12, self.requested_steer)
+        candidates = []
+        for dev in self.deviations:
+            steer = req_steer + dev*pi/9.0
+            if abs(steer) <= self.max_steer:
+                candidates.append((dev, self.path_library.quantize(steer)))
+        return candidates
+
+    def find_clear_path(self, steers, path_length, scan_points):
+        ''' Return the index of the first steer with a clear path, or None,
+        the paths checked up to and including that one and whether each of
+        them is blocked. '''
+        paths = []
+        self.hit_distances = []
+        for i, steer in enumerate(steers):
+            path_points, left_path, right_path = self.path_library.path(
+                steer, self.path_step, path_length)
+            paths.append(path_points)
+
+            left_index = path_near_points(left_path, scan_points, self.clearance)
+            right_index = path_near_points(right_path, scan_points, self.clearance)
+
+            hits = [index for index in (left_index, right_index) if index]
+            self.hit_distances.append(min(hits)*self.path_step if hits else None)
+
+            if not (left_index or right_index):
+                return i, paths, [True]*i + [False]
+        return None, paths, [True]*len(paths)
+
+    def find_clear_path_jit(self, steers, path_length, scan_points):
+        ''' Same as find_clear_path, using the collision_jit kernels on the
+        path library's track arrays. '''
+        n = collision_batch.path_sample_count(self.path_step, path_length) + 1
+        paths = []
+        self.hit_distances = []
+        for i, steer in enumerate(steers):
+            t = self.path_library.template(steer, self.path_step, path_length)
+            paths.append(t.points[:n])
+
+            ys = t.ys[:n]
+            left_index = collision_jit.path_near_points(
+                t.left_xs[:n], ys, scan_points, float(self.clearance))
+            right_index = collision_jit.path_near_points(
+                t.right_xs[:n], ys, scan_points, float(self.clearance))
+
+            hits = [index for index in (left_index, right_index) if index > 0]
+            self.hit_distances.append(min(hits)*self.path_step if hits else None)
+
+            if left_index <= 0 and right_index <= 0:
+                return i, paths, [True]*i + [False]
+        return None, paths, [True]*len(paths)
+
+    def find_clear_path_batch(self, steers, path_length, scan_points):
+        ''' Same as find_clear_path, but checks both wheel tracks of every
+        candidate against all the scan points at once. '''
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+        first = self.check_tracks(ys, left_xs, right_xs, scan_points)
+        return self.first_clear_batch(xs, ys, first)
+
+    def check_tracks(self, ys, left_xs, right_xs, scan_points):
+        ''' Index of the first point of each left track followed by each
+        right track near the scan points, -1 for none. '''
+        tracks_x = np.concatenate((left_xs, right_xs))
+        tracks_y = np.concatenate((ys, ys))
+        if not self.coarse_to_fine:
+            return collision_batch.paths_near_points(
+                tracks_x, tracks_y, scan_points, self.clearance)
+
+        scan_points = collision_batch.points_in_reach(
+            tracks_x, tracks_y, scan_points, self.clearance)
+        stride = max(1, int(round(self.coarse_step/self.path_step)))
+        first, fine = collision_batch.coarse_paths_near_points(
+            tracks_x, tracks_y, scan_points, self.clearance, stride, self.path_step)
+        if self.ttc_scaling:
+            # choose_by_ttc needs the first hit on every blocked track.
+            fine |= first > 0
+        first[fine] = collision_batch.paths_near_points(
+            tracks_x[fine], tracks_y[fine], scan_points, self.clearance)
+
+        checks = int(fine.sum())
+        self.fine_checks += checks
+        self.fine_checks_avoided += len(first) - checks
+        return first
+
+    def first_clear_batch(self, xs, ys, first):
+        # a hit on the starting point (index 0) doesn't block the path, the
+        # same as the 'left_index or right_index' test in find_clear_path.
+        n = len(xs)
+        blocked = (first[:n] > 0) | (first[n:] > 0)
+        self.set_hit_indexes(first[:n], first[n:])
+
+        if blocked.all():
+            return None, collision_batch.path_point_lists(xs, ys), [True]*n
+        clear = int(blocked.argmin())
+        paths = collision_batch.path_point_lists(xs, ys, clear + 1)
+        return clear, paths, [True]*clear + [False]
+
+    def find_clear_path_incremental(self, steers, path_length, scan_points, ranges):
+        ''' Same as find_clear_path_batch, but only re-checks the candidates
+        that a ray which changed by more than range_tolerance could block.
+        If none of the candidates up to the previous choice are affected, the
+        previous choice is reused without checking anything. '''
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+        r = np.asarray(ranges, dtype=float)
+        key = (len(r), tuple(self.path_library.quantize(steer) for steer in steers),
+               path_length, self.path_step, self.clearance,
+               self.scan_start_angle, self.scan_angle_inc)
+
+        if key != self.incremental_key:
+            self.full_evaluations += 1
+            first = self.check_tracks(ys, left_xs, right_xs, scan_points)
+            angles = np.radians(self.scan_start_angle
+                                + self.scan_angle_inc*np.arange(len(r)))
+            self.ray_tracks = collision_batch.rays_near_paths(
+                np.concatenate((left_xs, right_xs)), np.concatenate((ys, ys)),
+                angles, 5, self.clearance)
+            self.incremental_key = key
+            self.reference_ranges = r
+        else:
+            changed = np.abs(r - self.reference_ranges) > self.range_tolerance
+            recheck = self.ray_tracks[:,changed].any(axis=1)
+            n = len(steers)
+            recheck = recheck[:n] | recheck[n:]
+
+            first = self.incremental_first
+            previous = self.incremental_clear
+            relevant = recheck if previous is None else recheck[:previous + 1]
+            if not relevant.any():
+                self.skipped_evaluations += 1
+            else:
+                self.partial_evaluations += 1
+                first = first.copy()
+                both = np.concatenate((recheck, recheck))
+                first[both] = self.check_tracks(
+                    ys[recheck], left_xs[recheck], right_xs[recheck], scan_points)
+                self.reference_ranges = np.where(changed, r, self.reference_ranges)
+
+        self.incremental_first = first
+        clear, paths, blocked = self.first_clear_batch(xs, ys, first)
+        self.incremental_clear = clear
+        return clear, paths, blocked
+
+    def find_clear_path_clearance(self, steers, path_length, scan_points):
+        ''' Same as find_clear_path, but looks the clearance of every
+        candidate's wheel tracks up in a clearance map of the scan and
+        chooses with choose_by_clearance. '''
+        self.clearance_map.update(scan_points)
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+
+        # the starting point never blocks the path.
+        if xs.shape[1] > 1:
+            left = self.clearance_map.clearance(left_xs[:,1:], ys[:,1:])
+            right = self.clearance_map.clearance(right_xs[:,1:], ys[:,1:])
+            clearances = np.minimum(left.min(axis=1), right.min(axis=1))
+            near = np.minimum(left, right) < self.clearance
+            first = np.where(near.any(axis=1), near.argmax(axis=1) + 1, -1)
+        else:
+            clearances = np.full(len(steers), self.clearance_map.max_clearance)
+            first = np.full(len(steers), -1)
+        self.path_clearances = clearances.tolist()
+        self.set_hit_indexes(first, first)
+
+        clear, blocked = self.choose_by_clearance(clearances)
+        return clear, collision_batch.path_point_lists(xs, ys), blocked
+
+    def find_clear_path_analytic(self, steers, path_length, scan_points):
+        ''' Same as find_clear_path_clearance, but the clearances are the
+        exact distances from the obstacle points to the unsampled paths, less
+        track_offset. So obstacles between the wheel tracks block the path
+        too, and the cost doesn't depend on path_step. '''
+        if path_length > 0 and len(scan_points) > 0:
+            distance, along = collision_batch.arc_distances(
+                steers, path_length, scan_points)
+            clearances = distance.min(axis=1) - track_offset
+            in_way = distance < track_offset + self.clearance
+            hit = np.where(in_way, along, np.inf).min(axis=1)
+            self.hit_distances = [d if d < np.inf else None for d in hit.tolist()]
+        else:
+            clearances = np.full(len(steers), self.clearance_map.max_clearance)
+            self.hit_distances = [None]*len(steers)
+        self.path_clearances = clearances.tolist()
+
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+        clear, blocked = self.choose_by_clearance(clearances)
+        return clear, collision_batch.path_point_lists(xs, ys), blocked
+
+    def window_candidate_steers(self):
+        max_steer = min(self.max_steer, self.basic_controls.max_steer)
+        steers = np.linspace(-max_steer, max_steer, self.window_steers).tolist()
+        return [self.path_library.quantize(steer) for steer in steers]
+
+    def find_clear_path_window(self, steers, path_length, scan_points):
+        ''' Dynamic window search over (speed, steer) pairs reachable by the
+        next tick. Speeds are limited by max_accel and max_decel from the
+        current speed. A pair is admissible if the
+        vehicle could stop before the first obstacle on that path. The
+        admissible pair with the best weighted sum of heading (closeness to
+        the requested steer), free distance and speed is chosen. Returns the
+        same as find_clear_path and sets self.actual_speed. '''
+        max_steer = max(abs(steers[0]), abs(steers[-1]), 1e-6)
+        steers = np.array(steers)
+
+        v = self.vstate.speed
+        top = min(v + self.max_accel*self.window_dt, self.requested_speed)
+        bottom = max(v - self.max_decel*self.window_dt, 0)
+        speeds = np.linspace(min(bottom, top), top, self.window_speeds)
+
+        # distance along each path to the first obstacle in the way.
+        free = np.full(len(steers), np.inf)
+        if path_length > 0 and len(scan_points) > 0:
+            distance, along = collision_batch.arc_distances(
+                steers, path_length, scan_points)
+            in_way = distance < track_offset + self.clearance
+            free = np.where(in_way, along, np.inf).min(axis=1)
+
+        stopping = speeds**2/(2*self.max_decel) + self.clearance
+        admissible = (stopping[:,None] <= free[None,:]) & (speeds[:,None] > 0)
+
+        heading_score = 1 - np.abs(steers - self.requested_steer)/(2*max_steer)
+        free_score = np.minimum(free, 5)/5
+        speed_score = speeds/max(self.requested_speed, 1e-6)
+        w_heading, w_free, w_speed = self.window_weights
+        score = (w_heading*heading_score + w_free*free_score)[None,:] \
+                + (w_speed*speed_score)[:,None]
+        score = np.where(admissible, score, -np.inf)
+
+        blocked = ~admissible.any(axis=0)
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+        paths = collision_batch.path_point_lists(xs, ys)
+        if blocked.all():
+            return None, paths, blocked.tolist()
+
+        i, clear = np.unravel_index(int(score.argmax()), score.shape)
+        self.actual_speed = float(speeds[i])
+        return int(clear), paths, blocked.tolist()
+
+    def set_hit_indexes(self, left, right):
+        ''' Set hit_distances from the index of the first blocking point on
+        each candidate's left and right tracks, -1 or 0 for none. '''
+        first = np.where((left > 0) & ((left < right) | (right <= 0)), left, right)
+        self.hit_distances = [i*self.path_step if i > 0 else None
+                              for i in first.tolist()]
+
+    def hit_distance_ahead(self, steer, scan_points, ranges):
+        ''' Distance along the path for steer to the first obstacle near one
+        of its wheel tracks, looking the whole 5 m ahead, or None. '''
+        if isinstance(scan_points, PointGrid):
+            points = np.array(scan_points.points, dtype=float).reshape(-1, 2)
+        elif isinstance(scan_points, np.ndarray):
+            points = scan_points
+        else: # the table backend doesn't make points.
+            points = self.obstacle_array(ranges)
+
+        xs, ys, left_xs, right_xs = self.path_library.paths([steer], self.path_step, 5)
+        first = collision_batch.paths_near_points(
+            np.concatenate((left_xs, right_xs)), np.concatenate((ys, ys)),
+            points, self.clearance)
+        hits = first[first > 0]
+        return int(hits.min())*self.path_step if len(hits) > 0 else None
+
+    def choose_by_ttc(self):
+        ''' When every path is blocked, pick the one whose first obstacle is
+        furthest away and slow down to reach it no sooner than ttc_target
+        seconds from now. Return its index, or None if that speed is less
+        than min_ttc_speed. Sets actual_speed. '''
+        best = None
+        for i, d in enumerate(self.hit_distances):
+            if d is not None and (best is None or d > self.hit_distances[best]):
+                best = i
+        if best is None:
+            return None
+
+        speed = min(self.requested_speed, self.hit_distances[best]/self.ttc_target)
+        if speed < self.min_ttc_speed:
+            return None
+        self.actual_speed = speed
+        return best
+
+    def choose_by_clearance(self, clearances):
+        ''' Return the index of the chosen candidate, or None, and whether
+        each candidate is blocked. With rank_by_clearance set, the first
+        candidate with good_clearance is chosen, or the clearest one if none
+        has it. Otherwise the first clear one. '''
+        blocked = clearances < self.clearance
+        if blocked.all():
+            return None, blocked.tolist()
+
+        clear = int(blocked.argmin())
+        if self.rank_by_clearance and clearances[clear] < self.good_clearance:
+            good = clearances >= self.good_clearance
+            if good.any():
+                clear = int(good.argmax())
+            else:
+                clear = int(clearances.argmax())
+        return clear, blocked.tolist()
+
+    def find_clear_path_footprint(self, steers, path_length, scan_points):
+        ''' Same as find_clear_path, but a candidate is blocked if an
+        obstacle is inside the vehicle's body swept along its path, grown by
+        clearance, rather than near one of the two wheel tracks. '''
+        self.footprints.rasterize(scan_points)
+        candidates = [self.footprints.candidate(steer) for steer in steers]
+        known = [k for k in candidates if k is not None]
+        n = collision_batch.path_sample_count(self.path_step, path_length)
+        hits = iter(self.footprints.first_hits(known, n).tolist())
+
+        first = np.array([next(hits) if k is not None else 1 for k in candidates])
+        self.set_hit_indexes(first, first)
+
+        xs, ys, left_xs, right_xs = self.path_library.paths(
+            steers, self.path_step, path_length)
+        return self.first_clear_batch(xs, ys, np.concatenate((first, first)))
+
+    def find_clear_path_table(self, steers, path_length, ranges):
+        ''' Same as find_clear_path, but only looks up which candidates each
+        ray blocks in the ray table. '''
+        mask = self.ray_table.blocked_mask(ranges, path_length)
+
+        paths = []
+        for i, steer in enumerate(steers):
+            paths.append(self.path_library.path(steer, self.path_step, path_length)[0])
+            k = self.ray_table.candidate(steer)
+            if k is not None and not (mask >> k) & 1:
+                return i, paths, [True]*i + [False]
+        return None, paths, [True]*len(paths)
+
     def set_steer(self, angle):
         angle = clamp(-self.max_steer, self.max_steer, angle)
         # allow manual external steering control in reverse.
@@ -187,12 +808,43 @@ class CollisionController:
         self.requested_speed = 0
     
     def status(self):
-        d = {}
+        d = self.status_record
         d['enabled'] = self.enabled
+        d['backend'] = self.backend
+        d['active_backend'] = self.active_backend
         d['blocked'] = self.blocked
         d['path'] = self.last_path
         d['blocked_paths'] = self.blocked_paths
         d['obstacles'] = self.last_obstacles
         d['requested_steer'] = self.requested_steer
+        d['actual_speed'] = self.actual_speed
+        d['ttc'] = self.last_ttc
+        d['hit_distances'] = self.hit_distances
+        d['scheduler'] = self.scheduler.status()
+        if self.preprocess_scan:
+            d['scan_preprocessor'] = self.scan_preprocessor.status()
+        else:
+            d.pop('scan_preprocessor', None)
+        if self.incremental:
+            e = self.evaluations_record
+            e['full'] = self.full_evaluations
+            e['partial'] = self.partial_evaluations
+            e['skipped'] = self.skipped_evaluations
+            d['evaluations'] = e
+        else:
+            d.pop('evaluations', None)
+        if self.coarse_to_fine:
+            f = self.fine_checks_record
+            f['checked'] = self.fine_checks
+            f['avoided'] = self.fine_checks_avoided
+            d['fine_checks'] = f
+        else:
+            d.pop('fine_checks', None)
+        d['path_library'] = self.path_library.status()
+        d['path_clearances'] = self.path_clearances
+        if self.obstacle_source == 'grid':
+            d['occupancy_grid'] = self.occupancy_grid.status()
+        else:
+            d.pop('occupancy_grid', None)
         return d
 
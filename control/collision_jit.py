@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+from math import sin, cos, radians
+import numpy as np
+
+# Compiled versions of scan_to_points and path_near_points from
+# collision_control, for the 'jit' collision backend. They do the same
+# arithmetic in the same order as the python versions, so they find the same
+# points. Without numba the backend falls back to 'python'.
+try:
+    from numba import njit
+    available = True
+except ImportError:
+    available = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+@njit(cache=True)
+def scan_to_points(ranges, start_angle, angle_inc_degrees, non_range_val, threshold):
+    ''' Same points as collision_control.scan_to_points as an (n, 2) array. '''
+    count = 0
+    for r in ranges:
+        if r != non_range_val and r < threshold:
+            while r < 5:
+                count += 1
+                r += 1
+
+    points = np.empty((count, 2))
+    angle_degrees = start_angle
+    i = 0
+    for r in ranges:
+        if r != non_range_val and r < threshold:
+            while r < 5:
+                points[i, 0] = r*sin(radians(angle_degrees))
+                points[i, 1] = r*cos(radians(angle_degrees))
+                i += 1
+                r += 1
+        angle_degrees += angle_inc_degrees
+    return points
+
+@njit(cache=True)
+def path_near_points(xs, ys, points, threshold):
+    ''' Same as collision_control.path_near_points for the path xs, ys,
+    but returns -1 instead of None. '''
+    D = threshold**2
+    for num in range(len(xs)):
+        for j in range(points.shape[0]):
+            d = (xs[num] - points[j, 0])**2 + (ys[num] - points[j, 1])**2
+            if d < D:
+                return num
+    return -1
+
+def warm_up():
+    ''' Compile the kernels for the argument types collision_control calls
+    them with, which numba would otherwise do on the first scan. '''
+    points = scan_to_points(np.full(3, 5.0), -90.0, 5.0, -1.0, 5.0)
+    xs = np.zeros(2)
+    path_near_points(xs, xs, points, 0.5)
+    return True
+
+if __name__ == '__main__':
+    # Compare the decisions of the 'jit' and 'python' backends on
+    # collision_scans.txt, scans with requests to check each against, or on
+    # robot.scanner.txt files recorded by simulation/tools/dump_streams.py
+    # given as arguments, with random requests.
+    import os
+    import sys
+    import json
+    import time
+    import asyncio
+    from random import Random
+    import collision_jit
+    from state import VehicleState
+    from controls import VehicleControls
+    from speed_control import SpeedController
+    from collision_control import CollisionController
+
+    if not available:
+        print('numba is not installed, checking the kernels uncompiled.')
+        collision_jit.available = True
+
+    def controller(backend):
+        state = VehicleState()
+        controls = VehicleControls()
+        c = CollisionController(state, SpeedController(state, controls), controls)
+        c.backend = backend
+        return c
+
+    # with a running event loop the kernels are compiled in a worker thread
+    # and the python backend is used until they're ready.
+    async def background():
+        c = controller('jit')
+        c.prepare_tables()
+        while c.jit_kernels.pending is not None:
+            assert c.choose_backend(37) == 'python'
+            await asyncio.sleep(0.01)
+        assert c.choose_backend(37) == 'jit'
+
+    start = time.perf_counter()
+    asyncio.run(background())
+    print('warmed up in the background in %.2f s' % (time.perf_counter() - start))
+
+    python = controller('python')
+    jit = controller('jit')
+    jit.prepare_tables()
+    assert jit.jit_kernels.builds == 1
+
+    filenames = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                              'collision_scans.txt')]
+    rand = Random(0)
+    scans = 0
+    mismatches = 0
+    for filename in filenames:
+        for line in open(filename):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            scan = json.loads(line)
+            requests = scan.get('requests') or \
+                [(rand.uniform(-1, 1), rand.choice([1, 2.5, 5, 10])) for i in range(5)]
+            for steer, distance in requests:
+                for c in (python, jit):
+                    c.requested_steer = steer
+                    c.requested_distance = distance
+                    c.requested_speed = 1
+                    c.update_range(scan['range_list'])
+                scans += 1
+                assert jit.active_backend == 'jit'
+                if (python.blocked, python.actual_steer, python.hit_distances) != \
+                   (jit.blocked, jit.actual_steer, jit.hit_distances):
+                    mismatches += 1
+    print('%d scans, %d different decisions' % (scans, mismatches))
+    assert scans > 0 and mismatches == 0
+    if available:
+        # nothing was compiled after warm_up.
+        assert len(collision_jit.scan_to_points.signatures) == 1
+        assert len(collision_jit.path_near_points.signatures) == 1
@@ -0,0 +1,144 @@
+import asyncio
+from logging import exception
+
+class ControlScheduler:
+    ''' Calls step_fn at a fixed rate (Hz) from the event loop's monotonic
+    clock, with the time since the last step. That is simulation time from
+    time_fn, the seconds of the latest sensor timestamp or None, so a slowed
+    or paused simulation gives short or zero steps. Only while time_fn has
+    nothing is it the event loop's time. Keeps statistics of how late
+    each step started (jitter) and of the steps that ran past the next
+    deadline (overruns). Deadlines missed by an overrun are skipped rather
+    than run back to back. A step that raises is logged and counted in
+    failures, and the next one is still scheduled. '''
+
+    def __init__(self, step_fn, rate=10, time_fn=None):
+        self.step_fn = step_fn
+        self.rate = rate
+        self.time_fn = time_fn
+
+        self.handle = None
+        self.deadline = None
+        self.last_time = None
+        self.last_sim_time = None
+        self.dt = 0
+
+        self.ticks = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.jitter = 0
+        self.mean_jitter = 0
+        self.max_jitter = 0
+        self.duration = 0
+        self.max_duration = 0
+        self.status_record = {}
+
+    def start(self):
+        if self.handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self.deadline = loop.time()
+        self.handle = loop.call_at(self.deadline, self.tick)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.last_time = None
+        self.last_sim_time = None
+
+    def tick(self):
+        handle = self.handle
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        dt = 1.0/self.rate if self.last_time is None else now - self.last_time
+        self.last_time = now
+
+        sim_time = self.time_fn() if self.time_fn is not None else None
+        if sim_time is not None:
+            last = self.last_sim_time
+            self.last_sim_time = sim_time
+            dt = 0 if last is None or sim_time < last else sim_time - last
+        self.dt = dt
+
+        self.jitter = now - self.deadline
+        self.mean_jitter += 0.05*(self.jitter - self.mean_jitter)
+        self.max_jitter = max(self.max_jitter, self.jitter)
+        self.ticks += 1
+
+        try:
+            self.step_fn(dt)
+        except Exception:
+            self.failures += 1
+            exception('Control step failed.')
+        finally:
+            # unless step_fn stopped or restarted the scheduler.
+            if self.handle is handle:
+                self.schedule_next(loop, now)
+
+    def schedule_next(self, loop, now):
+        end = loop.time()
+        self.duration = end - now
+        self.max_duration = max(self.max_duration, self.duration)
+
+        period = 1.0/self.rate
+        self.deadline += period
+        if end > self.deadline:
+            self.overruns += 1
+            missed = int((end - self.deadline)/period) + 1
+            self.skipped += missed
+            self.deadline += missed*period
+        self.handle = loop.call_at(self.deadline, self.tick)
+
+    def status(self):
+        d = self.status_record
+        d['rate'] = self.rate
+        d['dt'] = self.dt
+        d['clock'] = 'loop' if self.last_sim_time is None else 'sensor'
+        d['ticks'] = self.ticks
+        d['failures'] = self.failures
+        d['overruns'] = self.overruns
+        d['skipped'] = self.skipped
+        d['jitter'] = self.jitter
+        d['mean_jitter'] = self.mean_jitter
+        d['max_jitter'] = self.max_jitter
+        d['duration'] = self.duration
+        d['max_duration'] = self.max_duration
+        return d
+
+if __name__ == '__main__':
+    # A paused or slowed simulation mustn't wind up the speed controller's
+    # integral: it only grows with the simulation time that passed.
+    from state import VehicleState
+    from controls import VehicleControls
+    from speed_control import SpeedController
+
+    def run(sim_rate):
+        ''' Run 0.5 s with simulation time going at sim_rate times ours and
+        the car not moving. Returns the integral and the simulation time. '''
+        state = VehicleState()
+        speed_control = SpeedController(state, VehicleControls())
+        speed_control.set_speed(2)
+        sim = {'time': 100.0}
+
+        def step(dt):
+            state.update_time(dt)
+            speed_control.update()
+            sim['time'] += sim_rate/scheduler.rate
+
+        async def main():
+            scheduler.start()
+            await asyncio.sleep(0.5)
+            scheduler.stop()
+
+        scheduler = ControlScheduler(step, rate=50, time_fn=lambda: sim['time'])
+        asyncio.run(main())
+        return speed_control.last_integral, sim['time'] - 100.0
+
+    for sim_rate in (0, 0.1, 1):
+        integral, elapsed = run(sim_rate)
+        print('simulation at %.1fx: integral %.3f after %.3f s of simulation time'
+              % (sim_rate, integral, elapsed))
+        # the error is 2 throughout, the last step's time isn't used yet.
+        assert abs(integral - 2*(elapsed - sim_rate/50)) < 1e-9
@@ -5,6 +5,8 @@ from logging import error, warning, info, debug
 from inspect import stack
 
 class VehicleControls:
+    __slots__ = ('throttle', 'brake', 'steer', 'max_steer', 'status_record')
+
     def __init__(self):
         # steering is in radians
         # positive steering value turns right.
@@ -13,13 +15,14 @@ class VehicleControls:
         self.brake = 0
         self.steer = 0
         self.max_steer = pi/4
+        self.status_record = {}
 
     def set_steer(self, val):
         self.steer = clamp(-self.max_steer, self.max_steer, val)
         #info('Controls set_steer %0.2f clamped to %0.2f from %s' % (val, self.steer, stack()[1][3]))
 
     def status(self):
-        d= {}
+        d = self.status_record
         d['throttle'] = self.throttle
         d['brake'] = self.brake
         d['steer'] = self.steer
@@ -0,0 +1,175 @@
+
+import os
+import zlib
+from math import pi, floor
+from logging import info, warning
+import numpy as np
+
+from vehicle_geometry import vehicle_length, axle_offset, min_turn_steer, \
+    half_width, front_length, rear_length, scanner_offset
+
+cache_dir = os.path.expanduser('~/.cache/morse-car-controller')
+
+class FootprintMasks:
+    ''' The vehicle's body, grown by clearance, swept along every candidate
+    path and rasterized onto a grid in the scanner's frame (x to the right,
+    y ahead). Paths start at the scanner, so the body starts out behind the
+    origin.
+
+    Candidates are the steers -max_steer..max_steer in steps of
+    steer_quantum, the path library's, so each is the arc that gets
+    commanded. Rather than a plain mask, each cell holds the path sample
+    index at which the body first covers it (255 for never), so a mask for
+    any path length is just a comparison. Cells the body itself covers at
+    the start, without the clearance, are in start_body and never block.
+    Building takes a while, so the masks are saved in cache_dir and loaded
+    from there when the parameters match. '''
+
+    version = 2
+
+    def __init__(self, max_steer, step, max_length=5, clearance=0.5,
+                 steer_quantum=pi/360, resolution=0.1,
+                 min_x=-6.0, max_x=6.0, min_y=-3.0, max_y=6.0):
+        self.step = step
+        self.steer_quantum = steer_quantum
+        self.resolution = resolution
+        self.min_x = min_x
+        self.min_y = min_y
+        self.max_index = int(floor(max_steer/steer_quantum + 1e-9))
+        self.cols = int(round((max_x - min_x)/resolution))
+        self.rows = int(round((max_y - min_y)/resolution))
+
+        self.params = np.array([self.version, max_steer, step, max_length,
+                                clearance, steer_quantum, resolution,
+                                min_x, max_x, min_y, max_y, half_width,
+                                front_length, rear_length, scanner_offset,
+                                vehicle_length, axle_offset])
+        name = 'footprints-%08x.npz' % zlib.crc32(self.params.tobytes())
+        self.cache_file = os.path.join(cache_dir, name)
+
+        cx = self.min_x + (np.arange(self.cols) + 0.5)*self.resolution
+        cy = self.min_y + (np.arange(self.rows) + 0.5)*self.resolution
+        self.cx, self.cy = np.meshgrid(cx, cy)
+
+        if not self.load():
+            info('Building footprint masks.')
+            self.build(max_length, clearance)
+            self.save()
+
+        self.start_body = self.body_cells(0, 0, 0, 0)
+        self.occupied = np.zeros((self.rows, self.cols), dtype=bool)
+
+    def load(self):
+        try:
+            data = np.load(self.cache_file)
+            if np.array_equal(data['params'], self.params):
+                self.first_cover = data['first_cover']
+                return True
+        except (OSError, KeyError, ValueError):
+            pass
+        return False
+
+    def save(self):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez_compressed(self.cache_file, params=self.params,
+                                first_cover=self.first_cover)
+        except OSError as err:
+            warning('Could not save footprint masks:' + str(err))
+
+    def body_cells(self, x, y, heading, clearance):
+        ''' Mask of the cells covered by the body grown by clearance, with
+        the scanner at x, y and the given heading. '''
+        dx = self.cx - x
+        dy = self.cy - y
+        side = dx*np.cos(heading) - dy*np.sin(heading)
+        ahead = dx*np.sin(heading) + dy*np.cos(heading)
+        return (np.abs(side) <= half_width + clearance) \
+            & (ahead <= front_length - scanner_offset + clearance) \
+            & (ahead >= -rear_length - scanner_offset - clearance)
+
+    def build(self, max_length, clearance):
+        # a cell is covered if the body reaches any part of it, not just its
+        # centre.
+        clearance += self.resolution/np.sqrt(2)
+
+        # sweep the body in small steps, recording the first path sample
+        # index each cell is covered at.
+        ds = min(self.step, self.resolution)/2
+        s = np.arange(0, max_length + ds/2, ds)
+        index = np.minimum(np.ceil(s/self.step - 1e-9), 254).astype(np.uint8)
+
+        steers = np.arange(-self.max_index, self.max_index + 1)*self.steer_quantum
+        self.first_cover = np.full((len(steers), self.rows, self.cols), 255, dtype=np.uint8)
+        for k, steer in enumerate(steers):
+            if abs(steer) > min_turn_steer:
+                sign = 1 if steer > 0 else -1
+                R = vehicle_length/np.tan(abs(steer))
+                Rm = np.sqrt(axle_offset**2 + R**2)
+                t = s/Rm
+                xs = sign*Rm*(1 - np.cos(t))
+                ys = Rm*np.sin(t)
+                headings = sign*t
+            else:
+                xs = np.zeros_like(s)
+                ys = s
+                headings = np.zeros_like(s)
+
+            cover = self.first_cover[k]
+            for x, y, h, i in zip(xs, ys, headings, index):
+                inside = self.body_cells(x, y, h, clearance)
+                np.minimum(cover, np.where(inside, i, 255).astype(np.uint8), out=cover)
+
+    def candidate(self, steer):
+        ''' Index of the candidate nearest to steer, or None. '''
+        index = int(round(steer/self.steer_quantum))
+        if abs(index) > self.max_index:
+            return None
+        return index + self.max_index
+
+    def rasterize(self, points):
+        ''' Mark the cells holding any of the (n, 2) array of points. '''
+        self.occupied.fill(False)
+        if len(points) > 0:
+            col = np.floor((points[:,0] - self.min_x)/self.resolution).astype(int)
+            row = np.floor((points[:,1] - self.min_y)/self.resolution).astype(int)
+            inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+            self.occupied[row[inside], col[inside]] = True
+        return self.occupied
+
+    def first_hits(self, candidates, num_samples):
+        ''' For each candidate index, the first path sample whose swept body
+        covers an occupied cell, -1 for none. Only samples up to num_samples
+        count, and a cell already inside the clearance at the start counts
+        as a hit on the first sample after it, so it blocks the path. '''
+        cells = self.occupied & ~self.start_body
+        cover = self.first_cover[candidates][:,cells] # (candidates, occupied cells)
+        cover = np.where(cover <= num_samples, np.maximum(cover, 1), 255)
+        first = cover.min(axis=1, initial=255).astype(int)
+        first[first == 255] = -1
+        return first
+
+if __name__ == '__main__':
+    # A wall just ahead of the scanner, inside the clearance, blocks every
+    # candidate. One within the path length plus the clearance blocks going
+    # straight. Obstacles within the body itself block nothing.
+    from collision_batch import path_sample_count
+
+    step = 0.25
+    masks = FootprintMasks(pi/4, step, clearance=0.5)
+    everything = list(range(2*masks.max_index + 1))
+    n = path_sample_count(step, 0.5)
+
+    for distance in (0.05, 0.3, 0.6, 1.0):
+        wall = np.column_stack((np.linspace(-3, 3, 61), np.full(61, distance)))
+        masks.rasterize(wall)
+        first = masks.first_hits(everything, n)
+        print('wall %.2f m ahead: %d of %d candidates blocked'
+              % (distance, np.count_nonzero(first > 0), len(first)))
+        assert first[masks.candidate(0)] > 0
+        if distance < 0.5:
+            assert (first > 0).all()
+
+    masks.rasterize(np.array([[0.0, -0.5], [0.4, -1.5], [-0.4, -0.05]]))
+    assert (masks.first_hits(everything, n) == -1).all()
+    print('obstacles in the body block nothing')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from math import sin, cos, tan, radians, degrees
+
+from geomath import earth_radius
+
+class LocalProjection:
+    ''' Local tangent plane around an origin: x meters east and y meters
+    north. Approximates the distance and heading from the origin that
+    geomath.distance_in_xy and point_from_xy use, to second order in the
+    distance, with the origin's trig worked out once. The error grows with
+    the cube of the distance from the origin, see __main__ below. '''
+
+    def __init__(self, origin):
+        self.origin = tuple(origin)
+        self.lat = radians(origin[0])
+        self.lon = radians(origin[1])
+
+        self.sin_lat = sin(self.lat)
+        self.cos_lat = cos(self.lat)
+        self.tan_lat = tan(self.lat)
+        self.R = earth_radius
+
+    def to_xy(self, lat, lon):
+        ''' Return x, y of a lat, lon in degrees. '''
+        dlat = radians(lat) - self.lat
+        dlon = radians(lon) - self.lon
+        R = self.R
+        x = R*dlon*(self.cos_lat - self.sin_lat*dlat)
+        y = R*(dlat + 0.5*self.sin_lat*self.cos_lat*dlon*dlon)
+        return x, y
+
+    def to_geo(self, x, y):
+        ''' Return lat, lon in degrees of an x, y. '''
+        R = self.R
+        dlat = (y - 0.5*self.tan_lat*x*x/R)/R
+        dlon = x*(1 + self.tan_lat*y/R)/(R*self.cos_lat)
+        return degrees(self.lat + dlat), degrees(self.lon + dlon)
+
+if __name__ == '__main__':
+    # Error against the great circle functions in geomath, for points out
+    # to each radius from the origin the vehicle uses.
+    from math import pi, hypot
+    from geomath import point_from_xy, distance_in_xy
+
+    origin = (-33.80784, 151.176614)
+    projection = LocalProjection(origin)
+
+    for radius, bound in ((100, 1e-6), (1000, 1e-4), (10000, 0.01)):
+        to_xy = 0
+        to_geo = 0
+        round_trip = 0
+        for i in range(360):
+            for r in (radius/4, radius/2, radius):
+                a = i*pi/180
+                x, y = r*sin(a), r*cos(a)
+
+                lat, lon = point_from_xy(origin, x, y)
+                px, py = projection.to_xy(lat, lon)
+                to_xy = max(to_xy, hypot(px - x, py - y))
+
+                glat, glon = projection.to_geo(x, y)
+                gx, gy = distance_in_xy(origin, (glat, glon))
+                to_geo = max(to_geo, hypot(gx - x, gy - y))
+
+                rx, ry = projection.to_xy(glat, glon)
+                round_trip = max(round_trip, hypot(rx - x, ry - y))
+
+        print('within %d m: to_xy error %.2g m, to_geo error %.2g m, round trip error %.2g m'
+              % (radius, to_xy, to_geo, round_trip))
+        assert max(to_xy, to_geo) < bound
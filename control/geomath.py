@@ -3,6 +3,7 @@
 from math import sin, cos, asin, atan2, sqrt, degrees, radians
 
 from collections import namedtuple
+import numpy as np
 
 GeoPoint = namedtuple('GeoPoint',['lat','lon'])
 
@@ -59,6 +60,66 @@ def distance_in_xy(a, b):
     y = distance*cos(t)
     return x,y
 
+# Array versions of the functions above. Points are arrays whose last axis
+# is (lat, lon), so a single point can be broadcast against many.
+
+def distances_and_directions(a, b):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    lat_s = np.radians(a[...,0])
+    lon_s = np.radians(a[...,1])
+    lat_f = np.radians(b[...,0])
+    lon_f = np.radians(b[...,1])
+    lat_d = lat_f - lat_s
+    lon_d = lon_f - lon_s
+
+    R = earth_radius
+
+    cos_s = np.cos(lat_s)
+    cos_f = np.cos(lat_f)
+    t1 = np.sin(lat_d/2)
+    t2 = np.sin(lon_d/2)
+    distance = R*2*np.arcsin(np.sqrt(t1*t1 + cos_s*cos_f*t2*t2))
+
+    y = np.sin(lon_d)*cos_f
+    x = cos_s*np.sin(lat_f) - np.sin(lat_s)*cos_f*np.cos(lon_d)
+    heading = np.degrees(np.arctan2(y, x))
+
+    same = (lat_d == 0) & (lon_d == 0)
+    return np.where(same, 0.0, distance), np.where(same, 0.0, heading)
+
+def points_from_distances_and_headings(a, distance, heading):
+    a = np.asarray(a, dtype=float)
+    lat_s = np.radians(a[...,0])
+    lon_s = np.radians(a[...,1])
+    t = np.radians(heading)
+    d = np.asarray(distance, dtype=float)
+
+    R = earth_radius
+
+    sin_s = np.sin(lat_s)
+    cos_s = np.cos(lat_s)
+    cos_d = np.cos(d/R)
+    sin_d = np.sin(d/R)
+    sin_f = sin_s*cos_d + cos_s*sin_d*np.cos(t)
+    lat_f = np.arcsin(sin_f)
+    lon_f = lon_s + np.arctan2(np.sin(t)*sin_d*cos_s, cos_d - sin_s*sin_f)
+
+    return np.stack((np.degrees(lat_f), np.degrees(lon_f)), axis=-1)
+
+def points_from_xy(a, x, y):
+    # this only works for small x,y distances.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    d = np.sqrt(x**2 + y**2)
+    h = np.degrees(np.arctan2(x, y)) # +y is north
+    return points_from_distances_and_headings(a, d, h)
+
+def distances_in_xy(a, b):
+    distance, heading = distances_and_directions(a, b)
+    t = np.radians(heading)
+    return distance*np.sin(t), distance*np.cos(t)
+
 if __name__ == '__main__':
     a = (-33.80784, 151.176614)
     b = (-23.5237,148.157959)
@@ -85,6 +146,32 @@ if __name__ == '__main__':
     print('%s to %s is %d at %0.2f degrees.' % (a, e, dist, heading))
 
     print(distance_in_xy(a, e))
-    
-
 
+    # the array versions against the scalar ones, and how long each takes
+    # over a 1M point track.
+    import time
+    n = 1000000
+    t = np.linspace(0, 2*np.pi, n)
+    xs = 5000*np.sin(t)*np.cos(3*t)
+    ys = 5000*np.sin(2*t)
+    ab = (-33.9, 151.2)
+
+    start = time.perf_counter()
+    points = points_from_xy(a, xs, ys)
+    px, py = distances_in_xy(a, points)
+    dist, heading = distances_and_directions(ab, points)
+    array_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalar_points = [point_from_xy(a, x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    scalar_xy = [distance_in_xy(a, p) for p in scalar_points]
+    scalar_dd = [distance_and_direction(ab, p) for p in scalar_points]
+    scalar_time = time.perf_counter() - start
+
+    assert np.allclose(points, scalar_points, rtol=0, atol=1e-12)
+    assert np.allclose(np.column_stack((px, py)), scalar_xy, rtol=0, atol=1e-6)
+    assert np.allclose(np.column_stack((dist, heading)), scalar_dd, rtol=1e-12, atol=1e-9)
+    assert distances_and_directions(a, a) == (0, 0)
+
+    print('%d points: scalar %0.2f s, array %0.3f s, %d times faster'
+          % (n, scalar_time, array_time, scalar_time/array_time))
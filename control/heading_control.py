@@ -11,6 +11,7 @@ class HeadingController:
         self.Kp = 1.0
         self.last_heading_error = 0
         self.last_steer = 0
+        self.status_record = {}
 
 #    def set_steer(self, steering):
 #        self.enabled = False
@@ -31,7 +32,7 @@ class HeadingController:
         self.last_steer = steer
     
     def status(self):
-        d = {}
+        d = self.status_record
         d['enabled'] = self.enabled
         d['target_heading'] = self.target_heading
         d['heading_error'] = self.last_heading_error
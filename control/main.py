@@ -4,12 +4,17 @@ import logging
 from logging import error, warning, info, debug
 import json
 import re
-import asyncore
+import asyncio
 import signal
+from time import monotonic
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 from client import Client
 from server import Server
-from utils import recursive_round, clamp
 
 from controls import VehicleControls
 from state import VehicleState
@@ -19,9 +24,17 @@ from collision_control import CollisionController
 from waypoint_control import WaypointController
 
 from morse_wrapper import MorseWrapper
+from sensor_stream import SensorStream
+from control_scheduler import ControlScheduler
+from bus import Bus
+from status_encoder import StatusEncoder
+from status_subscription import StatusSubscription
 
 class Main:
     def __init__(self):
+        self.exit_event = asyncio.Event()
+
+        self.motion_client = None
         self.sim_host = "localhost"
         self.service_port = 4000
         self.service_client = Client(connect_fn=self.service_connect, msg_fn=self.service_message, close_fn=self.service_disconnect)
@@ -34,13 +47,56 @@ class Main:
         self.state = VehicleState()
         self.speed_control = SpeedController(self.state, self.controls)
         self.collision_control = CollisionController(self.state, self.speed_control, self.controls)
+        self.collision_control.prepare_tables()
         self.heading_control = HeadingController(self.state, self.collision_control)
         self.waypoint_control = WaypointController(self.state, self.collision_control, self.heading_control)
 
         self.morse_wrapper = MorseWrapper()
 
+        # with coalesce set on a stream, frames that queued up while the
+        # controller was busy are skipped in favour of the newest. It is off
+        # unless set, e.g. by a command file.
+        self.range_stream = SensorStream()
+        self.pose_stream = SensorStream()
+        self.odometry_stream = SensorStream()
+        self.last_odometry_time = None
+
+        # runs control_step at a fixed rate once the motion port is
+        # connected, stepping by the sensors' simulation time.
+        self.control_scheduler = ControlScheduler(
+            self.control_step, rate=10, time_fn=self.sensor_time)
+
+        # sensors publish scan and pose, control_step publishes controls and
+        # send_status publishes status. Each subscriber gets the latest
+        # value, rate limited subscribers at most rate times a second.
+        # Odometry only updates the state's speed, which the speed
+        # controller reads in control_step.
+        self.bus = Bus({'scan':list, 'pose':VehicleState,
+                        'controls':VehicleControls, 'status':dict})
+        self.bus.subscribe('scan', self.collision_control.update_range)
+        self.bus.subscribe('pose', self.pose_update)
+        self.bus.subscribe('controls', lambda controls: self.send_motion_message())
+        self.status_rate = self.bus.subscribe(
+            'controls', lambda controls: self.send_status(), rate=10)
+        self.bus.subscribe('status', self.broadcast_status)
+
+        # send_status fills these in, and the components' own status
+        # records, so taking a status snapshot doesn't allocate.
+        self.status_record = {}
+        self.streams_record = {}
+        self.status_encoder = StatusEncoder(digits=4)
+
+        # encoder and projected status record for each set of fields
+        # status clients have subscribed to.
+        self.status_views = {}
+
     def exit(self):
-        raise asyncore.ExitNow("Exiting")
+        self.exit_event.set()
+
+    def close(self):
+        self.control_scheduler.stop()
+        self.status_server.close()
+        self.command_server.close()
 
     def send_service_message(self, identifier, component, message, data=[]):
         msg = '%s %s %s %s\n' % (identifier, component, message, json.dumps(data))
@@ -92,11 +148,11 @@ class Main:
             self.motion_client.create_connection(self.sim_host, int(data))
 
         elif identifier == 'range_port':
-            self.range_client = Client(connect_fn=self.range_connect, msg_fn = self.range_message, close_fn=self.range_disconnect)
+            self.range_client = Client(connect_fn=self.range_connect, lines_fn=self.range_lines, close_fn=self.range_disconnect)
             self.range_client.create_connection(self.sim_host, int(data))
 
         elif identifier == 'odometry_port':
-            self.odometry_client = Client(connect_fn=self.odometry_connect, msg_fn=self.odometry_message, close_fn=self.odometry_disconnect)
+            self.odometry_client = Client(connect_fn=self.odometry_connect, lines_fn=self.odometry_lines, close_fn=self.odometry_disconnect)
             self.odometry_client.create_connection(self.sim_host, int(data))
 
         elif identifier == 'gps_port':
@@ -108,7 +164,7 @@ class Main:
             self.compass_client.create_connection(self.sim_host, int(data))
 
         elif identifier == 'pose_port':
-            self.pose_client = Client(connect_fn=self.pose_connect, msg_fn=self.pose_message, close_fn=self.pose_disconnect)
+            self.pose_client = Client(connect_fn=self.pose_connect, lines_fn=self.pose_lines, close_fn=self.pose_disconnect)
             self.pose_client.create_connection(self.sim_host, int(data))
 
         else:
@@ -116,9 +172,11 @@ class Main:
 
     def motion_connect(self, client):
         info("Connected to motion port.")
-        
+        self.control_scheduler.start()
+
     def motion_disconnect(self, client):
         info("Disconnected from motion port.")
+        self.control_scheduler.stop()
 
     def motion_message(self, client, line):
         warning("Got unhandled motion message:" + line)
@@ -129,10 +187,15 @@ class Main:
     def range_disconnect(self, client):
         info("Disconnected from range port.")
 
+    def range_lines(self, client, lines):
+        for line in self.range_stream.select(lines):
+            self.range_message(client, line)
+
     def range_message(self, client, line):
         try:
             obj = json.loads(line)
-            self.collision_control.update_range(obj['range_list'])
+            self.range_stream.used(obj.get('timestamp'))
+            self.bus.publish('scan', obj['range_list'])
         except ValueError as err:
             error('Invalid range message:' + str(err))
             return
@@ -143,21 +206,60 @@ class Main:
     def odometry_disconnect(self, client):
         info("Disconnected from odometry port.") 
 
+    def odometry_lines(self, client, lines):
+        if not self.odometry_stream.coalesce:
+            for line in self.odometry_stream.select(lines):
+                self.odometry_message(client, line)
+            return
+
+        # dS is the distance since the last frame, so the skipped frames
+        # still have to be added up.
+        self.odometry_stream.select(lines)
+        dS = 0
+        count = 0
+        for line in lines:
+            try:
+                obj = json.loads(line)
+                dS += obj['dS']
+                count += 1
+            except ValueError as err:
+                warning('Invalid odometry message:' + str(err))
+        if count > 0:
+            self.odometry_stream.used(obj.get('timestamp'))
+            self.state.update_odometry(dS, self.odometry_dt(obj, count))
+
     def odometry_message(self, client, line):
         try:
             obj = json.loads(line)
-
-            dS = obj['dS']
-            dt = 0.1
-            self.state.update_time(dt)
-            self.state.update_odometry(dS, dt)
-            self.speed_control.update()
-            self.send_motion_message()
-            self.send_status()
-                
+            self.odometry_stream.used(obj.get('timestamp'))
+            self.state.update_odometry(obj['dS'], self.odometry_dt(obj))
         except ValueError as err:
             warning('Invalid odometry message:' + str(err))
 
+    def odometry_dt(self, obj, frames=1):
+        ''' Seconds since the last odometry frame from the MORSE timestamps,
+        or 0.1 a frame without them. '''
+        t = obj.get('timestamp')
+        last = self.last_odometry_time
+        self.last_odometry_time = t
+        if t is None or last is None or t <= last:
+            return 0.1*frames
+        return (t - last)/1000.0
+
+    def sensor_time(self):
+        ''' Seconds of the latest MORSE timestamp on any sensor, or None. '''
+        latest = None
+        for stream in (self.range_stream, self.pose_stream, self.odometry_stream):
+            t = stream.last_timestamp
+            if t is not None and (latest is None or t > latest):
+                latest = t
+        return None if latest is None else latest/1000.0
+
+    def control_step(self, dt):
+        self.state.update_time(dt)
+        self.speed_control.update()
+        self.bus.publish('controls', self.controls)
+
     def gps_connect(self, client):
         info("Connected to gps port.")
 
@@ -168,7 +270,7 @@ class Main:
         try:
             obj = json.loads(line)
             self.state.update_gps(obj['lat'], obj['lon'], obj['alt'], obj['speed'], obj['heading'])
-            self.waypoint_control.update()
+            self.bus.publish('pose', self.state)
         except ValueError as err:
             warning('Invalid gps message:' + str(err))
 
@@ -182,7 +284,7 @@ class Main:
         try:
             obj = json.loads(line)
             self.state.update_compass(obj['heading'])
-            self.heading_control.update()
+            self.bus.publish('pose', self.state)
         except ValueError as err:
             warning("Invalid compass message:" + str(err)) 
 
@@ -192,9 +294,14 @@ class Main:
     def pose_disconnect(self, client):
         info("Disconnected from pose port.")
 
+    def pose_lines(self, client, lines):
+        for line in self.pose_stream.select(lines):
+            self.pose_message(client, line)
+
     def pose_message(self, client, line):
         try:
             obj = json.loads(line)
+            self.pose_stream.used(obj.get('timestamp'))
             gps_msg, compass_msg = self.morse_wrapper.pose_message(obj)
 
             self.state.update_gps(
@@ -202,33 +309,87 @@ class Main:
                 gps_msg['alt'], gps_msg['speed'], gps_msg['heading'])
 
             self.state.update_compass(compass_msg['heading'])
-
-            self.waypoint_control.update()
-            self.heading_control.update()
+            self.bus.publish('pose', self.state)
 
         except ValueError as err:
             warning("Invalid pose message:" + str(err))
 
+    def pose_update(self, state):
+        self.waypoint_control.update()
+        self.heading_control.update()
+
     def send_status(self):
-        d = {}
+        d = self.status_record
         d['state'] = self.state.status()
         d['controls'] = self.controls.status()
         d['speed_control'] = self.speed_control.status()
         d['heading_control'] = self.heading_control.status()
         d['collision_control'] = self.collision_control.status()
         d['waypoint_control'] = self.waypoint_control.status()
-
-        msg = json.dumps(recursive_round(d,4)) + '\n'
-        self.status_server.broadcast(msg)
+        d['control_scheduler'] = self.control_scheduler.status()
+        streams = self.streams_record
+        streams['range'] = self.range_stream.status()
+        streams['pose'] = self.pose_stream.status()
+        streams['odometry'] = self.odometry_stream.status()
+        d['streams'] = streams
+        d['bus'] = self.bus.status()
+        d['status_encoder'] = self.status_encoder.status()
+        self.bus.publish('status', d)
+
+    def broadcast_status(self, d):
+        ''' Send each status client the fields it subscribed to, encoded
+        once for all the clients with the same fields. '''
+        now = monotonic()
+        encoded = {}
+        for client in self.status_server.clients:
+            subscription = client.status_subscription
+            if subscription is None:
+                key = None
+            elif subscription.due(now):
+                key = subscription.key
+            else:
+                continue
+
+            data = encoded.get(key)
+            if data is None:
+                if key is None:
+                    data = self.status_encoder.encode(d)
+                else:
+                    encoder, record = self.status_views[key]
+                    data = encoder.encode(subscription.project(d, record))
+                encoded[key] = data
+            client.send_data(data)
 
     def status_client_connect(self, client):
         info("Status client connected.")
+        client.status_subscription = None
 
     def status_client_disconnect(self, client):
         info("Status client disconnected.")
+        self.drop_unused_status_views()
 
     def status_client_msg(self, client, line):
-        warning("Status client received message, but no messages are supported.")
+        try:
+            subscription = StatusSubscription.from_message(json.loads(line))
+        except ValueError as err:
+            client.send_msg("ERROR: Invalid status subscription: " + str(err))
+            return
+
+        info("Status client subscribed to %s%s." % (
+            ', '.join(subscription.fields or ['everything']),
+            '' if subscription.max_rate is None else ' at %s Hz' % subscription.max_rate))
+        client.status_subscription = subscription
+        if subscription.key is not None and subscription.key not in self.status_views:
+            self.status_views[subscription.key] = (StatusEncoder(digits=4), {})
+        self.drop_unused_status_views()
+
+    def drop_unused_status_views(self):
+        used = set(client.status_subscription.key
+                   for client in self.status_server.clients
+                   if client.status_subscription is not None)
+        for key in list(self.status_views):
+            if key not in used:
+                del self.status_views[key]
 
     def command_client_connect(self, client):
         info("Command client connected.")
@@ -288,19 +449,29 @@ class Main:
 
         client.send_msg("OK")
 
-def sigint_handler(signnum, frame):
-    raise asyncore.ExitNow("Exiting")
+async def run():
+    main = Main()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGINT, main.exit)
+    await main.exit_event.wait()
+    info("Exiting")
+    main.close()
 
 if __name__ == '__main__':
 
     logging.basicConfig(level=logging.INFO)
 
-    signal.signal(signal.SIGINT, sigint_handler)
-
-    main = Main()
-
-    try:
-        asyncore.loop()
-    except asyncore.ExitNow:
-        pass
+    # uvloop is a faster drop in event loop, use it if it's installed.
+    loop_factory = None
+    if uvloop is not None:
+        info("Using uvloop.")
+        loop_factory = uvloop.new_event_loop
+
+    if hasattr(asyncio, 'Runner'):
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(run())
+    else:
+        # python before 3.11 has no Runner, so uvloop goes in as the policy.
+        if uvloop is not None:
+            uvloop.install()
+        asyncio.run(run())
 
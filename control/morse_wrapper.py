@@ -1,9 +1,11 @@
 from math import sqrt,atan2
-from geomath import GeoPoint, point_from_xy
+from geomath import GeoPoint
+from geodesy import LocalProjection
 
 class MorseWrapper:
     def __init__(self):
         self.origin = GeoPoint(-33.80784, 151.176614)
+        self.projection = LocalProjection(self.origin)
         self.last_x = None
         self.last_y = None
         self.last_t = None
@@ -23,7 +25,9 @@ class MorseWrapper:
             speed = 0.0
             heading = 0.0
 
-        lat,lon = point_from_xy(self.origin, x, y)
+        if self.projection.origin != self.origin:
+            self.projection = LocalProjection(self.origin)
+        lat,lon = self.projection.to_geo(x, y)
         alt = msg['z']
 
         gps_msg = {'lat':lat, 'lon':lon, 'alt':alt,
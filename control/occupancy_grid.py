@@ -0,0 +1,118 @@
+
+from math import sin, cos, floor
+import numpy as np
+
+class OccupancyGrid:
+    ''' Log-odds occupancy grid of the area around the vehicle.
+
+    The grid is aligned with the world x (east) and y (north) axes and is
+    scrolled a whole cell at a time to keep the vehicle near its centre, so
+    moving never resamples the cells. The vehicle's heading is applied to
+    the rays going in and the obstacle points coming out instead. Each update
+    touches at most one cell per ray sample, so the cost is fixed by the grid
+    size and the number of rays. '''
+
+    def __init__(self, size=12.0, resolution=0.1, max_range=5,
+                 hit=0.85, miss=-0.4, min_odds=-2.0, max_odds=3.5, occupied=0.5):
+        self.resolution = resolution
+        self.max_range = max_range
+        self.hit = hit
+        self.miss = miss
+        self.min_odds = min_odds
+        self.max_odds = max_odds
+        self.occupied = occupied
+
+        self.num_cells = int(round(size/resolution))
+        self.cells = np.zeros((self.num_cells, self.num_cells), dtype=np.float32)
+        self.spare = np.zeros_like(self.cells)
+
+        # world cell index of cells[0, 0], as (column, row).
+        self.origin = None
+
+        num_samples = int(floor(max_range/resolution))
+        self.ray_steps = (np.arange(num_samples) + 0.5)*resolution
+        self.status_record = {}
+
+    def clear(self):
+        self.cells.fill(0)
+        self.origin = None
+
+    def move_to(self, x, y):
+        ''' Scroll the grid so the world position x, y is near the centre. '''
+        half = self.num_cells//2
+        origin = (int(floor(x/self.resolution)) - half,
+                  int(floor(y/self.resolution)) - half)
+        if self.origin is None:
+            self.origin = origin
+            return
+
+        dc = origin[0] - self.origin[0]
+        dr = origin[1] - self.origin[1]
+        if dc == 0 and dr == 0:
+            return
+
+        n = self.num_cells
+        self.spare.fill(0)
+        if abs(dc) < n and abs(dr) < n:
+            src = self.cells[max(dr, 0):n + min(dr, 0), max(dc, 0):n + min(dc, 0)]
+            self.spare[max(-dr, 0):n + min(-dr, 0), max(-dc, 0):n + min(-dc, 0)] = src
+        self.cells, self.spare = self.spare, self.cells
+        self.origin = origin
+
+    def cell_index(self, wx, wy):
+        ''' Flat cell indexes for world positions and a mask of the ones
+        that are inside the grid. '''
+        col = np.floor(wx/self.resolution).astype(int) - self.origin[0]
+        row = np.floor(wy/self.resolution).astype(int) - self.origin[1]
+        inside = (col >= 0) & (col < self.num_cells) & (row >= 0) & (row < self.num_cells)
+        return row*self.num_cells + col, inside
+
+    def update_scan(self, x, y, heading, ranges, start_angle, angle_inc_degrees,
+                    non_range_val=-1):
+        ''' Add a scan taken by a scanner at world position x, y with the
+        given heading (radians clockwise from north). '''
+        self.move_to(x, y)
+
+        r = np.asarray(ranges, dtype=float)
+        angles = heading + np.radians(start_angle + angle_inc_degrees*np.arange(len(r)))
+        hit = (r != non_range_val) & (r < self.max_range)
+        free_range = np.where(hit, r, self.max_range)
+
+        # cells along each ray up to the return are free.
+        steps = self.ray_steps[None,:]
+        along = steps < free_range[:,None]
+        d = np.broadcast_to(steps, along.shape)[along]
+        a = np.broadcast_to(angles[:,None], along.shape)[along]
+        free, inside = self.cell_index(x + d*np.sin(a), y + d*np.cos(a))
+        free = np.unique(free[inside])
+
+        occupied, inside = self.cell_index(x + r[hit]*np.sin(angles[hit]),
+                                           y + r[hit]*np.cos(angles[hit]))
+        occupied = np.unique(occupied[inside])
+        free = np.setdiff1d(free, occupied, assume_unique=True)
+
+        flat = self.cells.reshape(-1)
+        flat[free] += self.miss
+        flat[occupied] += self.hit
+        np.clip(self.cells, self.min_odds, self.max_odds, out=self.cells)
+
+    def obstacle_points(self, x, y, heading):
+        ''' Centres of the occupied cells in the frame of a scanner at world
+        position x, y with the given heading, x to the right and y ahead, as
+        an (n, 2) array. '''
+        if self.origin is None:
+            return np.zeros((0, 2))
+
+        row, col = np.nonzero(self.cells > self.occupied)
+        wx = (col + self.origin[0] + 0.5)*self.resolution - x
+        wy = (row + self.origin[1] + 0.5)*self.resolution - y
+        c = cos(heading)
+        s = sin(heading)
+        return np.column_stack((wx*c - wy*s, wx*s + wy*c))
+
+    def status(self):
+        d = self.status_record
+        d['resolution'] = self.resolution
+        d['cells'] = self.num_cells
+        d['occupied'] = int(np.count_nonzero(self.cells > self.occupied))
+        return d
@@ -0,0 +1,92 @@
+
+from math import pi
+from collections import OrderedDict
+import numpy as np
+
+import collision_batch
+from vehicle_geometry import Point, track_offset
+
+class PathTemplate:
+    def __init__(self, steer, step, length):
+        self.steer = steer
+        self.step = step
+        self.length = length
+
+        xs, ys = collision_batch.make_paths([steer], step, length)
+        self.xs = xs[0]
+        self.ys = ys[0]
+        self.left_xs = self.xs - track_offset
+        self.right_xs = self.xs + track_offset
+
+        # python versions for the non-numpy collision check.
+        ys = self.ys.tolist()
+        self.points = [Point(x, y) for x, y in zip(self.xs.tolist(), ys)]
+        self.left = [Point(x, y) for x, y in zip(self.left_xs.tolist(), ys)]
+        self.right = [Point(x, y) for x, y in zip(self.right_xs.tolist(), ys)]
+
+class PathLibrary:
+    ''' Sampled candidate paths and their wheel tracks, built once per
+    quantized steer and step and cut to length when they are looked up.
+    The least recently used templates are dropped when the library is full. '''
+
+    def __init__(self, max_length=5, steer_quantum=pi/360, max_size=256):
+        self.max_length = max_length
+        self.steer_quantum = steer_quantum
+        self.max_size = max_size
+
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.status_record = {}
+
+    def quantize(self, steer):
+        return round(steer/self.steer_quantum)*self.steer_quantum
+
+    def template(self, steer, step, path_length):
+        key = (round(steer/self.steer_quantum), step)
+        template = self.templates.get(key)
+
+        if template is not None and template.length >= path_length:
+            self.hits += 1
+            self.templates.move_to_end(key)
+            return template
+
+        self.misses += 1
+        template = PathTemplate(key[0]*self.steer_quantum, step,
+                                max(self.max_length, path_length))
+        self.templates[key] = template
+        self.templates.move_to_end(key)
+        if len(self.templates) > self.max_size:
+            self.templates.popitem(last=False)
+            self.evictions += 1
+        return template
+
+    def path(self, steer, step, path_length):
+        ''' Return the path, left track and right track as lists of points. '''
+        t = self.template(steer, step, path_length)
+        n = collision_batch.path_sample_count(step, path_length) + 1
+        return t.points[:n], t.left[:n], t.right[:n]
+
+    def paths(self, steers, step, path_length):
+        ''' Return x, y, left track x and right track x arrays with one row
+        per steer, like collision_batch.make_paths. '''
+        n = collision_batch.path_sample_count(step, path_length) + 1
+        templates = [self.template(steer, step, path_length) for steer in steers]
+        shape = (len(steers), n)
+        xs = np.array([t.xs[:n] for t in templates]).reshape(shape)
+        ys = np.array([t.ys[:n] for t in templates]).reshape(shape)
+        left_xs = np.array([t.left_xs[:n] for t in templates]).reshape(shape)
+        right_xs = np.array([t.right_xs[:n] for t in templates]).reshape(shape)
+        return xs, ys, left_xs, right_xs
+
+    def clear(self):
+        self.templates.clear()
+
+    def status(self):
+        d = self.status_record
+        d['size'] = len(self.templates)
+        d['hits'] = self.hits
+        d['misses'] = self.misses
+        d['evictions'] = self.evictions
+        return d
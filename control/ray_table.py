@@ -0,0 +1,124 @@
+
+from math import pi, floor
+import numpy as np
+
+import collision_batch
+from vehicle_geometry import track_offset
+
+class RayBlockTable:
+    ''' Precomputed answers to "does ray i with range r block candidate k".
+
+    Candidates are the steering angles -max_steer..max_steer in steps of
+    steer_quantum, which must be the path library's so each candidate is
+    the arc that gets commanded. For each path sample count, ray and range bin the table
+    holds an int with bit k set if an obstacle in that bin blocks candidate k,
+    so checking a scan is just OR-ing one int per ray.
+
+    An obstacle anywhere in a range bin is treated as blocking, so the bins
+    are checked with the clearance plus half the bin size. '''
+
+    def __init__(self, num_rays, start_angle, angle_inc_degrees, max_steer,
+                 step, max_length=5, clearance=0.5, range_bin=0.1,
+                 max_range=5, steer_quantum=pi/360):
+        self.num_rays = num_rays
+        self.start_angle = start_angle
+        self.angle_inc_degrees = angle_inc_degrees
+        self.step = step
+        self.max_range = max_range
+        self.range_bin = range_bin
+        self.steer_quantum = steer_quantum
+        self.max_index = int(floor(max_steer/steer_quantum + 1e-9))
+        self.num_bins = int(floor(max_range/range_bin + 1e-9))
+
+        indexes = np.arange(-self.max_index, self.max_index + 1)
+        steers = indexes*steer_quantum
+        xs, ys = collision_batch.make_paths(steers, step, max_length)
+
+        # obstacle points for the middle of every (ray, bin), padded every
+        # meter out to max_range like scan_to_points does.
+        angles = np.radians(start_angle + angle_inc_degrees*np.arange(num_rays))
+        r = (np.arange(self.num_bins) + 0.5)*range_bin
+        pads = np.arange(int(np.ceil(max_range)))
+        rr = r[:,None] + pads
+        sin_a = np.sin(angles)[:,None,None]
+        cos_a = np.cos(angles)[:,None,None]
+        px = rr*sin_a # (rays, bins, pads)
+        py = rr*cos_a
+        valid = np.broadcast_to(rr < max_range, px.shape)
+
+        D = (clearance + range_bin/2)**2
+        num_samples = xs.shape[1]
+        # first blocking sample index per candidate, ray and bin.
+        first = np.full((len(steers), num_rays, self.num_bins), num_samples)
+        for k in range(len(steers)):
+            for offset in (-track_offset, track_offset):
+                tx = xs[k] + offset
+                dx = tx[:,None,None,None] - px
+                dy = ys[k][:,None,None,None] - py
+                # the starting point never blocks the path.
+                near = ((dx*dx + dy*dy < D) & valid).any(axis=3)[1:] # (samples, rays, bins)
+                index = near.argmax(axis=0) + 1
+                index[~near.any(axis=0)] = num_samples
+                first[k] = np.minimum(first[k], index)
+
+        self.masks = []
+        for n in range(num_samples):
+            blocked = (first <= n).transpose(1, 2, 0)
+            packed = np.packbits(blocked, axis=2, bitorder='little')
+            self.masks.append([[int.from_bytes(b.tobytes(), 'little') for b in row]
+                               for row in packed])
+
+    def blocked_mask(self, ranges, path_length):
+        ''' Return an int with bit k set for each blocked candidate. '''
+        n = min(collision_batch.path_sample_count(self.step, path_length),
+                len(self.masks) - 1)
+        masks = self.masks[n]
+        mask = 0
+        for ray, r in enumerate(ranges):
+            if 0 <= r < self.max_range:
+                mask |= masks[ray][int(r/self.range_bin)]
+        return mask
+
+    def candidate(self, steer):
+        ''' Bit number of the candidate nearest to steer, or None. '''
+        index = int(round(steer/self.steer_quantum))
+        if abs(index) > self.max_index:
+            return None
+        return index + self.max_index
+
+if __name__ == '__main__':
+    # Every candidate the exact wheel track check blocks, the table must
+    # block too, including steers either side of min_turn_steer where the
+    # paths change from straight lines to arcs.
+    from random import Random
+    from vehicle_geometry import min_turn_steer
+    from path_library import PathLibrary
+
+    step = 0.25
+    clearance = 0.5
+    table = RayBlockTable(37, 90, -5, pi/4, step, clearance=clearance)
+    library = PathLibrary(max_length=5)
+    boundary = [min_turn_steer + d for d in (-0.01, -0.0003, 0, 0.0003, 0.01)]
+    boundary += [-steer for steer in boundary]
+
+    rand = Random(0)
+    checked = 0
+    for i in range(2000):
+        ranges = [rand.choice([5, 5, 5, rand.uniform(0.3, 5)]) for ray in range(37)]
+        points = collision_batch.scan_to_array(ranges, 90, -5)
+        path_length = rand.choice([1, 2.3, 5])
+        steers = boundary + [rand.uniform(-pi/4, pi/4) for k in range(10)]
+        steers = [library.quantize(steer) for steer in steers]
+
+        xs, ys, left_xs, right_xs = library.paths(steers, step, path_length)
+        first = collision_batch.paths_near_points(
+            np.concatenate((left_xs, right_xs)), np.concatenate((ys, ys)),
+            points, clearance)
+        exact = (first[:len(steers)] > 0) | (first[len(steers):] > 0)
+
+        mask = table.blocked_mask(ranges, path_length)
+        for steer, blocked in zip(steers, exact):
+            checked += 1
+            assert not blocked or (mask >> table.candidate(steer)) & 1, \
+                'table misses a blocked path, steer %.4f' % steer
+    print('%d candidates, the table blocks every one the exact check does' % checked)
@@ -0,0 +1,97 @@
+
+import numpy as np
+
+class ScanPreprocessor:
+    ''' Prepares raw scans for the collision controller with array
+    operations, so high resolution scanners don't need a python loop per ray.
+
+    Invalid returns (non_range_val, nan, out of range) are masked, groups of
+    rays are min-pooled down to output_degrees_per_ray and, if
+    outlier_distance is set, returns with no neighbour within that distance
+    are dropped. Invalid rays come out as non_range_val. '''
+
+    def __init__(self, output_degrees_per_ray=None, min_range=0, max_range=5,
+                 non_range_val=-1, outlier_distance=None):
+        self.output_degrees_per_ray = output_degrees_per_ray
+        self.min_range = min_range
+        self.max_range = max_range
+        self.non_range_val = non_range_val
+        self.outlier_distance = outlier_distance
+
+        # layout of the last output scan.
+        self.start_angle = 0
+        self.angle_inc_degrees = 0
+
+        self.layout = None
+        self.unit_x = None
+        self.unit_y = None
+        self.status_record = {}
+
+    def group_size(self, angle_inc_degrees):
+        if not self.output_degrees_per_ray:
+            return 1
+        return max(1, int(round(self.output_degrees_per_ray/abs(angle_inc_degrees))))
+
+    def process(self, ranges, start_angle, angle_inc_degrees):
+        ''' Return the processed ranges as an array. The output ray layout
+        is left in start_angle and angle_inc_degrees. '''
+        r = np.asarray(ranges, dtype=float)
+        valid = (r != self.non_range_val) & (r >= self.min_range) & (r < self.max_range)
+        r = np.where(valid, r, np.inf) # nan compares false, so is masked too.
+
+        group = self.group_size(angle_inc_degrees)
+        if group > 1:
+            pad = -len(r) % group
+            r = np.concatenate((r, np.full(pad, np.inf)))
+            r = r.reshape(-1, group).min(axis=1)
+
+        if self.outlier_distance is not None and len(r) > 2:
+            d = self.outlier_distance
+            before = np.concatenate(([np.inf], r[:-1]))
+            after = np.concatenate((r[1:], [np.inf]))
+            # inf - inf is nan, which isn't > d, so runs of invalid rays
+            # aren't isolated.
+            with np.errstate(invalid='ignore'):
+                isolated = (np.abs(before - r) > d) & (np.abs(after - r) > d)
+            r = np.where(isolated, np.inf, r)
+
+        # the pooled rays point at the middle of their group.
+        self.start_angle = start_angle + angle_inc_degrees*(group - 1)/2.0
+        self.angle_inc_degrees = angle_inc_degrees*group
+        self.update_layout(len(r))
+
+        return np.where(np.isinf(r), self.non_range_val, r)
+
+    def update_layout(self, num_rays):
+        layout = (num_rays, self.start_angle, self.angle_inc_degrees)
+        if layout == self.layout:
+            return
+        angles = np.radians(self.start_angle + self.angle_inc_degrees*np.arange(num_rays))
+        self.unit_x = np.sin(angles) # to the right of the vehicle
+        self.unit_y = np.cos(angles) # ahead of the vehicle
+        self.layout = layout
+
+    def points(self, ranges):
+        ''' Obstacle points for ranges returned by process, padded every
+        meter out to max_range like scan_to_points, as an (n, 2) array. '''
+        r = np.asarray(ranges, dtype=float)
+        hit = (r != self.non_range_val) & (r < self.max_range)
+        if not hit.any():
+            return np.zeros((0, 2))
+
+        r = r[hit]
+        pads = np.arange(int(np.ceil(self.max_range - r.min())))
+        rr = r[:,None] + pads
+        keep = rr < self.max_range
+        ux = np.broadcast_to(self.unit_x[hit][:,None], keep.shape)[keep]
+        uy = np.broadcast_to(self.unit_y[hit][:,None], keep.shape)[keep]
+        rr = rr[keep]
+        return np.column_stack((rr*ux, rr*uy))
+
+    def status(self):
+        d = self.status_record
+        d['rays'] = self.layout[0] if self.layout else 0
+        d['degrees_per_ray'] = abs(self.angle_inc_degrees)
+        d['output_degrees_per_ray'] = self.output_degrees_per_ray
+        d['outlier_distance'] = self.outlier_distance
+        return d
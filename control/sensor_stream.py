@@ -0,0 +1,48 @@
+from time import monotonic
+from collections import deque
+
+class SensorStream:
+    ''' Frame accounting for a sensor stream. With coalesce set, when several
+    frames arrive together only the newest is used and the rest are counted
+    as dropped. It is off by default, so every frame is used. '''
+
+    def __init__(self, coalesce=False, window=100):
+        self.coalesce = coalesce
+        self.frames = 0
+        self.dropped = 0
+
+        # age of the last used frame: how much later, against its MORSE
+        # timestamp, it was used than the quickest of the last window frames.
+        # The window lets the simulation clock drift from ours.
+        self.age = None
+        self.max_age = 0
+        self.offsets = deque(maxlen=window)
+        self.last_timestamp = None # ms, of the last used frame
+        self.status_record = {}
+
+    def select(self, lines):
+        ''' Return the lines to use out of the ones received together. '''
+        self.frames += len(lines)
+        if not self.coalesce or len(lines) < 2:
+            return lines
+        self.dropped += len(lines) - 1
+        return lines[-1:]
+
+    def used(self, timestamp):
+        ''' Record the timestamp (ms) of a frame that was used. '''
+        if timestamp is None:
+            return
+        self.last_timestamp = timestamp
+        offset = monotonic() - timestamp/1000.0
+        self.offsets.append(offset)
+        self.age = offset - min(self.offsets)
+        self.max_age = max(self.max_age, self.age)
+
+    def status(self):
+        d = self.status_record
+        d['coalesce'] = self.coalesce
+        d['frames'] = self.frames
+        d['dropped'] = self.dropped
+        d['age'] = self.age
+        d['max_age'] = self.max_age
+        return d
@@ -1,40 +1,58 @@
-import asyncore
-import socket
+import asyncio
 from logging import error, info, warning
 
 from client import Client
 
-class Server(asyncore.dispatcher):
+class Server:
 
-    def __init__(self, port, connect_fn=None, msg_fn=None, close_fn=None):
-        asyncore.dispatcher.__init__(self)
-        self.create_socket()
-        self.set_reuse_addr()
-        self.bind(('localhost', port))
-        self.listen(5)
+    def __init__(self, port, connect_fn=None, msg_fn=None, close_fn=None, lines_fn=None):
+        self.port = port
 
         self.client_connect_fn = connect_fn
         self.client_msg_fn = msg_fn
         self.client_close_fn = close_fn
+        self.client_lines_fn = lines_fn
 
         self.clients = []
+        self.server = None
+        self.task = asyncio.get_running_loop().create_task(self.listen())
 
-    def handle_accepted(self, sock, addr):
-        client = Client(sock)
-        client.msg_fn = self.client_msg_fn
-        client.close_fn = self.client_close
-        
+    async def listen(self):
+        try:
+            self.server = await asyncio.get_running_loop().create_server(
+                self.make_client, 'localhost', self.port, reuse_address=True)
+        except OSError as err:
+            error("Server failed to listen on port %d: %s" % (self.port, err))
+
+    def make_client(self):
+        return Client(connect_fn=self.client_connect, msg_fn=self.client_msg_fn,
+                      close_fn=self.client_close, lines_fn=self.client_lines_fn)
+
+    def client_connect(self, client):
         self.clients.append(client)
 
         if self.client_connect_fn:
             self.client_connect_fn(client)
 
     def client_close(self, client):
-        self.clients.remove(client)
+        if client in self.clients:
+            self.clients.remove(client)
 
         if self.client_close_fn:
             self.client_close_fn(client)
-        
+
     def broadcast(self, msg):
+        if not msg.endswith('\n'):
+            msg += '\n'
+        self.broadcast_data(msg.encode())
+
+    def broadcast_data(self, data):
+        ''' Send already encoded, newline terminated messages to every client. '''
         for client in self.clients:
-            client.send_msg(msg)
+            client.send_data(data)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        for client in list(self.clients):
+            client.close()
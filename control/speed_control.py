@@ -19,6 +19,7 @@ class SpeedController:
         self.brake = 0
 
         self.last_update_time = 0
+        self.status_record = {}
 
     def stop(self):
         self.stopping = True
@@ -51,7 +52,7 @@ class SpeedController:
         else:
             error = abs(self.target_speed) - current_speed
             integral = self.last_integral + error*dt
-            derivative = (error - self.last_error)/dt
+            derivative = (error - self.last_error)/dt if dt > 0 else 0
 
             throttle = self.Kp*error + self.Ki*integral + self.Kd*derivative
 
@@ -63,12 +64,13 @@ class SpeedController:
 
         self.last_error = error
         self.last_integral = integral
+        self.last_update_time = self.vstate.time
 
         self.controls.throttle = throttle
         self.controls.brake = brake
 
     def status(self):
-        d = {}
+        d = self.status_record
         d['enabled'] = self.enabled
         d['target'] = self.target_speed
         d['integral'] = self.last_integral
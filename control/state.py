@@ -1,8 +1,12 @@
 
 
 from geomath import *
+from geodesy import LocalProjection
 
 class VehicleState:
+    __slots__ = ('roll', 'pitch', 'yaw', 'heading', 'x', 'y', 'z', 'speed',
+                 'distance', 'time', 'origin', 'projection', 'status_record')
+
     def __init__(self):
         self.roll = 0
         self.pitch = 0
@@ -19,12 +23,18 @@ class VehicleState:
         self.time = 0
 
         self.origin = (-33.80784, 151.176614)
+        self.projection = LocalProjection(self.origin)
+
+        # filled in by status, so a status snapshot doesn't allocate.
+        self.status_record = {}
     
     def update_time(self, dt):
         self.time += dt
     
     def update_gps(self, lat, lon, alt, speed, heading):
-        self.x, self.y = distance_in_xy(self.origin, (lat, lon))
+        if self.projection.origin != tuple(self.origin):
+            self.projection = LocalProjection(self.origin)
+        self.x, self.y = self.projection.to_xy(lat, lon)
         self.z = alt
 
     def update_odometry(self, dS, dt):
@@ -36,7 +46,7 @@ class VehicleState:
         self.yaw = -self.heading
 
     def status(self):
-        d = {}
+        d = self.status_record
         d['roll'] = self.roll
         d['pitch'] = self.pitch
         d['yaw'] = self.yaw
@@ -47,4 +57,3 @@ class VehicleState:
         d['time'] = self.time
         d['heading'] = self.heading
         return d
-
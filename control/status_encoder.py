@@ -0,0 +1,211 @@
+import json
+from math import isnan, isinf
+import numpy as np
+
+class EncodedValue:
+    ''' The last encoding of one value in the status message, and of the
+    values inside it if it's a dict. '''
+    __slots__ = ('value', 'data', 'children', 'parts')
+
+    def __init__(self):
+        self.value = None
+        self.data = None
+        self.children = {}
+        self.parts = []
+
+def snapshot(v):
+    ''' Copy of v to compare it with later, with the lists and dicts in it
+    copied too. '''
+    if type(v) is list:
+        return [snapshot(x) for x in v]
+    if type(v) is dict:
+        return {k: snapshot(x) for k, x in v.items()}
+    if type(v) is tuple:
+        return tuple(snapshot(x) for x in v)
+    return v
+
+def all_floats(v):
+    ''' Whether every number in the nested lists v is a float. '''
+    for x in v:
+        if isinstance(x, (list, tuple)):
+            if not all_floats(x):
+                return False
+        elif not isinstance(x, float):
+            return False
+    return True
+
+class StatusEncoder:
+    ''' JSON encoder for the status message that rounds floats to digits as
+    it goes and keeps the encoding of every value. A dict whose values all
+    encode the same as last time, and a list equal to a copy of it taken
+    when it was last encoded, reuse their bytes. The copy goes down through
+    nested lists, so lists edited in place are noticed too. '''
+
+    def __init__(self, digits=4):
+        self.digits = digits
+        self.root = EncodedValue()
+        self.keys = {}
+        self.json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+        self.encoded = 0
+        self.reused = 0
+        self.status_record = {}
+
+    def encode(self, d):
+        ''' Return the message as a newline terminated line of bytes. '''
+        return self.encode_value(self.root, d) + b'\n'
+
+    def encode_value(self, node, v):
+        if type(v) is dict:
+            return self.encode_dict(node, v)
+
+        if node.data is not None and type(node.value) is type(v) and node.value == v:
+            if isinstance(v, (list, tuple)):
+                self.reused += 1
+            return node.data
+
+        if isinstance(v, (list, tuple)):
+            self.encoded += 1
+            node.data = self.json_encoder.encode(self.round_value(v)).encode()
+            node.value = snapshot(v)
+        else:
+            node.data = self.encode_scalar(v)
+            node.value = v
+        return node.data
+
+    def encode_dict(self, node, d):
+        parts = []
+        for k, v in d.items():
+            key = self.keys.get(k)
+            if key is None:
+                key = self.keys[k] = self.json_encoder.encode(str(k)).encode() + b':'
+            child = node.children.get(k)
+            if child is None:
+                child = node.children[k] = EncodedValue()
+            if parts:
+                parts.append(b',')
+            parts.append(key)
+            parts.append(self.encode_value(child, v))
+
+        old = node.parts
+        if node.data is not None and len(parts) == len(old) \
+           and all(a is b for a, b in zip(parts, old)):
+            self.reused += 1
+            return node.data
+
+        self.encoded += 1
+        node.parts = parts
+        node.data = b'{' + b''.join(parts) + b'}'
+        return node.data
+
+    def encode_scalar(self, v):
+        if v is None:
+            return b'null'
+        if v is True:
+            return b'true'
+        if v is False:
+            return b'false'
+        if isinstance(v, float) and not (isnan(v) or isinf(v)):
+            return float.__repr__(round(float(v), self.digits)).encode()
+        return self.json_encoder.encode(self.round_value(v)).encode()
+
+    def round_value(self, v):
+        ''' Copy of v with the floats rounded. '''
+        if isinstance(v, float):
+            return round(v, self.digits)
+        if type(v) is dict:
+            return {k: self.round_value(x) for k, x in v.items()}
+        if not isinstance(v, (list, tuple)):
+            return v
+
+        # lists of floats, like point lists, are rounded as arrays. ints
+        # stay ints, so lists with any in them go the slow way.
+        if len(v) > 0 and all_floats(v):
+            try:
+                a = np.asarray(v, dtype=float)
+            except (TypeError, ValueError):
+                a = None
+            # None comes out as nan, so those go the slow way.
+            if a is not None and not np.isnan(a).any():
+                return np.round(a, self.digits).tolist()
+        return [self.round_value(x) for x in v]
+
+    def status(self):
+        d = self.status_record
+        d['encoded'] = self.encoded
+        d['reused'] = self.reused
+        return d
+
+if __name__ == '__main__':
+    # A whole status send, from Main.send_status through the bus and the
+    # encoder to a client, shouldn't keep any memory tick after tick, and
+    # at its peak should need about one encoded message.
+    import asyncio
+    import logging
+    import tracemalloc
+    from main import Main
+
+    class StatusClient:
+        status_subscription = None
+        def send_data(self, data):
+            self.data = data
+
+    async def measure():
+        main = Main()
+        main.close()
+        client = StatusClient()
+        main.status_server.clients.append(client)
+
+        collision_control = main.collision_control
+        collision_control.requested_speed = 1
+        collision_control.requested_distance = 3
+        collision_control.update_range([5]*18 + [1.5] + [5]*18)
+        main.waypoint_control.add_waypoints([(10.5, 20.25), (30, 40)])
+
+        def tick():
+            main.state.time += 0.1
+            main.state.x += 0.01
+            main.send_status()
+
+        for i in range(10):
+            tick()
+        size = len(client.data)
+
+        # tracemalloc.stop clears the peak, reset_peak needs python 3.9.
+        tracemalloc.start()
+        tick()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # what is kept is the latest encoding, replacing the last one, so
+        # it mustn't grow with the number of ticks.
+        ticks = 1000
+        tracemalloc.start()
+        for i in range(ticks):
+            tick()
+        kept = tracemalloc.get_traced_memory()[0]
+        for i in range(ticks):
+            tick()
+        growth = tracemalloc.get_traced_memory()[0] - kept
+        tracemalloc.stop()
+
+        print('status send of %d bytes: %d bytes at peak in a tick, %d bytes kept, '
+              '%d more after another %d ticks' % (size, peak, kept, growth, ticks))
+        assert peak < 4*size
+        assert kept < 4*size
+        assert growth < 256
+
+    # lists edited in place are sent again, and ints stay ints.
+    encoder = StatusEncoder()
+    points = [(1, 2.5), (3, 4)]
+    d = {'points': points, 'path': [[0.123456, 1.0], [2.0, 3.0]]}
+    encoder.encode(d)
+    points.pop(0)
+    points.append((5, 6.0))
+    d['path'][0][0] = 0.5
+    data = encoder.encode(d)
+    assert data == b'{"points":[[3,4],[5,6.0]],"path":[[0.5,1.0],[2.0,3.0]]}\n', data
+    assert encoder.encode(d) == data and encoder.reused == 3
+
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(measure())
@@ -0,0 +1,66 @@
+class StatusSubscription:
+    ''' What a status client has asked to be sent: some of the status
+    message's sections or fields, named like 'state' or
+    'waypoint_control.points', and at most max_rate messages a second.
+    With no fields it gets everything. '''
+
+    def __init__(self, fields=None, max_rate=None):
+        self.fields = sorted(set(fields)) if fields else None
+        self.max_rate = max_rate
+        self.paths = [field.split('.') for field in self.fields or []]
+        self.key = tuple(self.fields) if self.fields else None
+        self.last_time = None
+
+    @classmethod
+    def from_message(cls, msg):
+        ''' Make a subscription from a client message like
+        {"subscribe": ["state", "controls.steer"], "max_rate": 5}.
+        Raises ValueError if the message isn't one. '''
+        if type(msg) is not dict or not set(msg) <= {'subscribe', 'max_rate'}:
+            raise ValueError('Expected {"subscribe": [fields], "max_rate": rate}')
+
+        fields = msg.get('subscribe')
+        if fields is not None:
+            if type(fields) is not list or not all(type(f) is str and f for f in fields):
+                raise ValueError('subscribe must be a list of field names.')
+
+        max_rate = msg.get('max_rate')
+        if max_rate is not None:
+            if type(max_rate) not in (int, float) or max_rate <= 0:
+                raise ValueError('max_rate must be a positive number.')
+
+        return cls(fields, max_rate)
+
+    def due(self, now):
+        ''' Return True if a message can be sent at time now, seconds on a
+        monotonic clock, and count it as sent. '''
+        if self.max_rate is not None and self.last_time is not None \
+           and now - self.last_time < 1.0/self.max_rate:
+            return False
+        self.last_time = now
+        return True
+
+    def project(self, d, record):
+        ''' Fill record with the subscribed fields of the status message d
+        and return it. Fields d doesn't have are left out. '''
+        if self.fields is None:
+            return d
+
+        for path in self.paths:
+            src = d
+            dst = record
+            for key in path[:-1]:
+                src = src.get(key)
+                if type(src) is not dict:
+                    break
+                nested = dst.get(key)
+                if nested is None:
+                    nested = dst[key] = {}
+                dst = nested
+            else:
+                key = path[-1]
+                if key in src:
+                    dst[key] = src[key]
+                else:
+                    dst.pop(key, None)
+        return record
@@ -0,0 +1,29 @@
+
+from math import tan, sqrt
+from collections import namedtuple
+
+Point = namedtuple('Point',['x','y'])
+
+# MiniHummer dimensions, the hummer scaled down by 1/3.
+vehicle_length = (1.6 + 2.3)/3.0
+axle_offset = 2.3/3.0 # distance from vehicle's 'center' to the back axle
+track_offset = 1.0 # distance from the path to each wheel track
+
+# body outline around the vehicle's 'center'.
+half_width = 1.6/3.0
+front_length = 2.5/3.0
+rear_length = 2.5/3.0
+
+# the scanner is on the front, this far ahead of the 'center'. Scan points
+# and candidate paths start from it.
+scanner_offset = 2.5/3.0
+
+# steering angles smaller than this are treated as driving straight.
+min_turn_steer = 0.1
+
+def turn_radius(steer_radians):
+    ''' Radius of the circle driven by the vehicle's mid-point. '''
+    R = vehicle_length/tan(abs(steer_radians))
+    Rm = sqrt(axle_offset**2 + R**2)
+    Rm*=1.0 # hack to mess with the turning circle.
+    return Rm
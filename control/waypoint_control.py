@@ -19,6 +19,7 @@ class WaypointController:
         self.reverse_start_distance = 0
         self.reverse_steer_set = False
         self.reversing = False
+        self.status_record = {}
 
     def add_waypoint(self, x, y):
         self.points.append((x,y))
@@ -82,7 +83,7 @@ class WaypointController:
             debug("Waypoint control completed all waypoints.")
 
     def status(self):
-        d = {}
+        d = self.status_record
         d['enabled'] = self.enabled
         d['points'] = self.points
         d['distance'] = self.last_distance
@@ -170,7 +170,12 @@ class MainWindow(Qt.QWidget):
         self.plot = CollisionPlot()
         self.grid.addWidget(self.plot, 0, 0)
 
-        self.connection = Connection('localhost', 60212, self.update)
+        self.connection = Connection('localhost', 60212, self.update,
+            subscribe={'subscribe': [
+                'collision_control.enabled', 'collision_control.blocked',
+                'collision_control.path', 'collision_control.blocked_paths',
+                'collision_control.obstacles', 'collision_control.requested_steer',
+                'controls.steer', 'waypoint_control.reversing']})
 
     def update(self, msg):
         self.plot.on_msg(msg)        
@@ -4,10 +4,14 @@ from logging import warning, error, info
 import json
 
 class Connection:
-    def __init__(self, host, port, update_fn):
+    def __init__(self, host, port, update_fn, subscribe=None):
+        ''' subscribe is an optional status subscription message, like
+        {'subscribe': ['state', 'controls.steer'], 'max_rate': 5}, sent
+        each time the connection is made. '''
         self.host = host
         self.port = port
         self.update_fn = update_fn
+        self.subscribe = subscribe
 
         self.sock = Qt.QTcpSocket()
         self.sock.connected.connect(self.connected)
@@ -23,6 +27,8 @@ class Connection:
 
     def connected(self):
         info('Connected to host!')
+        if self.subscribe is not None:
+            self.sock.write(json.dumps(self.subscribe) + '\n')
 
     def disconnected(self):
         info("Disconnected from host!")
@@ -217,7 +217,8 @@ class MainWindow(Qt.QWidget):
         self.plot = MapPlot()
         self.grid.addWidget(self.plot, 0, 0)
 
-        self.connection = Connection('localhost', 60212, self.update)
+        self.connection = Connection('localhost', 60212, self.update,
+            subscribe={'subscribe': ['state', 'controls.steer', 'waypoint_control.points']})
 
     def update(self, msg):
         self.plot.on_msg(msg)        